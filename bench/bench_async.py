@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+
+# ops/sec of batch on small objects, each phase (create, get, head and
+# delete) run once on the thread pool and once with --async against the
+# stub. the stub is a single python process, on a small machine it may be
+# what limits both
+#
+#   python3 bench/bench_async.py [ops] [thread jobs] [async jobs] \
+#                                                   | tee bench_output.txt
+
+import os
+import sys
+
+from common import Stub, run
+
+OPS         = 2000
+DATA        = 'x' * 512
+THREAD_JOBS = 32
+ASYNC_JOBS  = 256
+
+def operations(stub, mode, ops):
+    # the batch input of each phase
+    out = os.path.join(stub.dir, mode)
+    os.makedirs(out, exist_ok = True)
+    key = '%s/%%05d' % mode
+    return [
+        ('create', ['create-object -b bench -k %s -d %s' % (key % i, DATA)
+                                                    for i in range(ops)]),
+        ('get',    ['get-object -b bench -k %s -F %s' % (key % i,
+                                        os.path.join(out, '%05d' % i))
+                                                    for i in range(ops)]),
+        ('head',   ['head-object -b bench -k %s' % (key % i)
+                                                    for i in range(ops)]),
+        ('delete', ['delete-object -b bench -k %s' % (key % i)
+                                                    for i in range(ops)]),
+    ]
+
+def main():
+    ops         = int(sys.argv[1]) if len(sys.argv) > 1 else OPS
+    thread_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else THREAD_JOBS
+    async_jobs  = int(sys.argv[3]) if len(sys.argv) > 3 else ASYNC_JOBS
+    modes       = [('threads', ['-j', str(thread_jobs)])]
+    try:
+        import aiohttp
+        modes.append(('async', ['-j', str(async_jobs), '--async']))
+    except ImportError:
+        print('aiohttp is not installed, --async is skipped')
+
+    with Stub() as stub:
+        print('%-8s %-8s %10s %8s' % ('phase', 'mode', 'ops/sec', 'status'))
+        for mode, args in modes:
+            for phase, lines in operations(stub, mode, ops):
+                path = os.path.join(stub.dir, '%s.%s' % (mode, phase))
+                with open(path, 'w') as f:
+                    f.write('\n'.join(lines) + '\n')
+                with open(path) as f:
+                    code, seconds, stats = run(['batch', '-f', stub.conf]
+                                               + args, env = stub.env(),
+                                               stdin = f, measure = False)
+                print('%-8s %-8s %10.1f %8d' % (phase, mode, ops / seconds,
+                                                code))
+                sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/python3
+
+# peak rss of get-object against objects of growing size served by the
+# stub, it should stay flat: the body is written chunk by chunk, never
+# held whole
+#
+#   python3 bench/bench_get_stream.py [sizes...] | tee bench_output.txt
+#
+# sizes are like 256M or 4G, the defaults are below. each object is saved
+# to a file with -F <file>, then written to stdout (dropped) with -F -
+
+import os
+import sys
+
+from common import Stub, run, mb
+
+SIZES = ['64M', '512M', '2G']
+
+def main():
+    sizes = sys.argv[1:] or SIZES
+    with Stub() as stub:
+        target = os.path.join(stub.dir, 'object')
+        print('%-8s %-8s %10s %10s %8s' % ('size', 'target', 'peak rss',
+                                           'MB/s', 'status'))
+        for size in sizes:
+            for name, path in (('file', target), ('stdout', '-')):
+                code, seconds, stats = run(['get-object', '-f', stub.conf,
+                                            '-b', 'bench',
+                                            '-k', 'virtual/%s' % size,
+                                            '-F', path], env = stub.env())
+                if path != '-' and os.path.exists(path):
+                    os.remove(path)
+                rate = stats.get('wchar', 0) / (1 << 20) / seconds
+                print('%-8s %-8s %10s %10.1f %8d' % (size, name,
+                                        mb(stats['maxrss']), rate, code))
+                sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+
+# peak rss and io of uploading a file in parts with upload-multipart,
+# straight from the file with --part-size against pre-split part files,
+# the split itself counted in. rchar and wchar are the bytes passed to
+# read and write calls, read_bytes and write_bytes what reached the disk
+# (0 while the file is in the page cache)
+#
+#   python3 bench/bench_parts.py [size] [part size] | tee bench_output.txt
+
+import os
+import sys
+import json
+import shutil
+import subprocess
+
+from common import Stub, QS_CLI, run, mb
+
+SIZE      = '256M'
+PART_SIZE = '32M'
+COUNTERS  = ('rchar', 'wchar', 'read_bytes', 'write_bytes')
+
+def parse_size(size):
+    unit = {'K' : 1 << 10, 'M' : 1 << 20, 'G' : 1 << 30}.get(size[-1:], 1)
+    return int(size.rstrip('KMG')) * unit
+
+def proc_io():
+    with open('/proc/self/io') as f:
+        return dict((name, int(value)) for name, _, value in
+                        (line.partition(':') for line in f))
+
+def initiate(stub, key):
+    output = subprocess.check_output([sys.executable, QS_CLI,
+                                      'initiate-multipart', '-f', stub.conf,
+                                      '-b', 'bench', '-k', key],
+                                     env = stub.env())
+    return json.loads(output.decode().split(' ', 2)[2])['upload_id']
+
+def split(source, size, part_size):
+    # the part files and the io of writing them, as split(1) would
+    before = proc_io()
+    parts  = []
+    with open(source, 'rb') as src:
+        for number in range((size + part_size - 1) // part_size):
+            path = '%s.part%d' % (source, number)
+            with open(path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, part_size)
+            parts.append(path)
+    after  = proc_io()
+    return parts, dict((name, after[name] - before[name])
+                            for name in COUNTERS)
+
+def upload(stub, key, parts):
+    # parts are (part number, upload-multipart arguments), returns the
+    # total io and the highest peak rss of the runs
+    upload_id = initiate(stub, key)
+    total     = dict((name, 0) for name in COUNTERS)
+    total['maxrss'] = 0
+    for number, args in parts:
+        code, seconds, stats = run(['upload-multipart', '-f', stub.conf,
+                                    '-b', 'bench', '-k', key,
+                                    '-u', upload_id, '-p', str(number)]
+                                   + args, env = stub.env())
+        if code:
+            print('[ERROR] part %d exited with %d' % (number, code))
+            sys.exit(-1)
+        for name in COUNTERS:
+            total[name] += stats.get(name, 0)
+        total['maxrss'] = max(total['maxrss'], stats['maxrss'])
+    return total
+
+def main():
+    size      = parse_size(sys.argv[1] if len(sys.argv) > 1 else SIZE)
+    part_size = parse_size(sys.argv[2] if len(sys.argv) > 2 else PART_SIZE)
+    with Stub() as stub:
+        source = os.path.join(stub.dir, 'source')
+        with open(source, 'wb') as f:
+            for i in range(0, size, 1 << 20):
+                f.write(os.urandom(min(1 << 20, size - i)))
+        count  = (size + part_size - 1) // part_size
+
+        sliced = upload(stub, 'sliced', [(n, ['-F', source, '--part-size',
+                                              str(part_size)])
+                                                for n in range(count)])
+        files, split_io = split(source, size, part_size)
+        presplit = upload(stub, 'presplit', list(enumerate(
+                                ['-F', path] for path in files)))
+
+        print('%d bytes in %d parts of %d' % (size, count, part_size))
+        print('%-10s %10s %10s %10s %10s %10s' % (('upload', 'peak rss')
+                                                  + COUNTERS))
+        for name, stats, extra in (('sliced', sliced, None),
+                                   ('pre-split', presplit, split_io)):
+            values = [stats[counter] + (extra or {}).get(counter, 0)
+                            for counter in COUNTERS]
+            print('%-10s %10s %10s %10s %10s %10s' % ((name,
+                        mb(stats['maxrss'])) + tuple(mb(v) for v in values)))
+        print('the pre-split totals include the split: %s' % ', '.join(
+                '%s %s' % (counter, mb(split_io[counter]))
+                                for counter in COUNTERS))
+
+if __name__ == '__main__':
+    main()
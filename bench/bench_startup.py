@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+
+# startup cost of short qs_cli runs: the import time reported by
+# python -X importtime, whether the sdk got imported at all, and the
+# median wall-clock time of each run, head-object going to the stub
+#
+#   python3 bench/bench_startup.py [runs] | tee bench_output.txt
+
+import sys
+import subprocess
+
+from common import Stub, QS_CLI, run, median
+
+RUNS = 20
+
+def import_time(args, env):
+    # (total microseconds, sdk imported) from -X importtime
+    proc  = subprocess.run([sys.executable, '-X', 'importtime', QS_CLI]
+                           + args, env = env, stdout = subprocess.DEVNULL,
+                           stderr = subprocess.PIPE, universal_newlines = True)
+    total = 0
+    sdk   = False
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, _, name = line.split(':', 1)[1].split('|')
+        total += int(own)
+        sdk    = sdk or name.strip().startswith('qingstor')
+    return total, sdk
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else RUNS
+    with Stub() as stub:
+        cases = [
+            ('--version',   ['--version']),
+            ('invalid',     ['no-such-action']),
+            ('head-object', ['head-object', '-f', stub.conf, '-b', 'bench',
+                             '-k', 'virtual/1K']),
+        ]
+        print('%-12s %12s %6s %12s' % ('run', 'imports ms', 'sdk',
+                                       'median ms'))
+        for name, args in cases:
+            total, sdk = import_time(args, stub.env())
+            seconds    = [run(args, env = stub.env(), measure = False)[1]
+                                for i in range(runs)]
+            print('%-12s %12.1f %6s %12.1f' % (name, total / 1000.0,
+                                               sdk and 'yes' or 'no',
+                                               median(seconds) * 1000))
+            sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# helpers shared by the benchmarks: a stub server in its own process, a
+# config file pointing at it and qs_cli runs measured from the inside
+
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+QS_CLI    = os.path.join(os.path.dirname(BENCH_DIR), 'qs_cli.py')
+MEASURE   = os.path.join(BENCH_DIR, 'measure.py')
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class Stub(object):
+    # the stub server and a scratch directory with a config file for it
+
+    def __init__(self):
+        self.port = free_port()
+        self.proc = subprocess.Popen(
+                [sys.executable, os.path.join(BENCH_DIR, 'stub.py'),
+                 str(self.port)], stdout = subprocess.PIPE)
+        self.proc.stdout.readline()
+        self.tmp  = tempfile.TemporaryDirectory(prefix = 'qs_cli_bench.')
+        self.dir  = self.tmp.name
+        self.conf = os.path.join(self.dir, 'config.yaml')
+        with open(self.conf, 'w') as f:
+            f.write('qy_access_key_id: "bench"\n'
+                    'qy_secret_access_key: "bench"\n'
+                    'zone: ""\n'
+                    'host: "127.0.0.1"\n'
+                    'port: %d\n'
+                    'protocol: "http"\n' % self.port)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        self.proc.wait()
+        self.tmp.cleanup()
+
+    def env(self):
+        # caches and journals of the runs stay in the scratch directory
+        env = dict(os.environ, HOME = self.dir)
+        env.pop('QS_CLI_SOCKET', None)
+        return env
+
+def run(args, env = None, stdin = None, measure = True):
+    # runs qs_cli with args, returns (exit status, seconds, stats) where
+    # stats has the peak rss in bytes and the /proc/self/io counters of
+    # the process, stdout is dropped
+    fd, path = tempfile.mkstemp(prefix = 'qs_cli_stats.')
+    os.close(fd)
+    command  = [sys.executable] + (measure and [MEASURE, path] or []) \
+                    + [QS_CLI] + list(args)
+    start    = time.time()
+    code     = subprocess.call(command, env = env, stdin = stdin,
+                               stdout = subprocess.DEVNULL)
+    seconds  = time.time() - start
+    try:
+        with open(path) as f:
+            stats = json.loads(f.read() or '{}')
+    finally:
+        os.remove(path)
+    return code, seconds, stats
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def mb(size):
+    return '%.1fM' % (size / (1 << 20))
@@ -0,0 +1,30 @@
+# runs a python script and writes its peak rss and io counters as json
+# to a file when it exits, however it exits
+#
+#   python3 bench/measure.py <stats_file> <script> [args]
+
+import sys
+import json
+import runpy
+import resource
+
+def dump(path):
+    stats = {'maxrss' : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                                                                    * 1024}
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                stats[name] = int(value)
+    except IOError:     # not linux
+        pass
+    with open(path, 'w') as f:
+        f.write(json.dumps(stats))
+
+if __name__ == '__main__':
+    path     = sys.argv[1]
+    sys.argv = sys.argv[2:]
+    try:
+        runpy.run_path(sys.argv[0], run_name = '__main__')
+    finally:
+        dump(path)
@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+
+# a local stand-in for the object storage api, just enough of it for the
+# benchmarks. signatures are not checked, objects live in memory and keys
+# under virtual/<size> are any size without being stored: their bytes are
+# made up as they are sent
+#
+#   python3 bench/stub.py <port>
+
+import sys
+import json
+import time
+import hashlib
+import threading
+from http.server    import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse   import urlparse, parse_qsl, unquote
+
+CHUNK   = 1024 * 1024
+PATTERN = bytes(range(256)) * (CHUNK // 256)
+VIRTUAL = 'virtual/'
+
+objects = {}    # (bucket, key) -> (data, etag)
+uploads = {}    # upload id -> {part number: (size, etag)}
+lock    = threading.Lock()
+
+def virtual_size(key):
+    # 'virtual/2G' -> number of bytes, None for stored keys
+    if not key.startswith(VIRTUAL):
+        return None
+    size = key[len(VIRTUAL):]
+    unit = {'K' : 1 << 10, 'M' : 1 << 20, 'G' : 1 << 30}.get(size[-1:], 1)
+    return int(size.rstrip('KMG')) * unit
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def parse(self):
+        url    = urlparse(self.path)
+        parts  = unquote(url.path).lstrip('/').split('/', 1)
+        bucket = parts[0]
+        key    = parts[1] if len(parts) > 1 else ''
+        return bucket, key, dict(parse_qsl(url.query,
+                                           keep_blank_values = True))
+
+    def read_body(self, keep = True):
+        # multipart bodies are only counted, never kept
+        size = int(self.headers.get('Content-Length') or 0)
+        md5  = hashlib.md5()
+        data = []
+        while size:
+            chunk = self.rfile.read(min(size, CHUNK))
+            if not chunk:
+                break
+            size -= len(chunk)
+            md5.update(chunk)
+            if keep:
+                data.append(chunk)
+        return b''.join(data), '"%s"' % md5.hexdigest()
+
+    def reply(self, status, body = None, headers = None):
+        data = json.dumps(body).encode() if body is not None else b''
+        headers = dict({'Content-Length' : str(len(data))},
+                       **(headers or {}))
+        self.send_response(status)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def lookup(self, bucket, key):
+        # (size, etag, data), None when missing
+        size = virtual_size(key)
+        if size is not None:
+            return size, '"virtual-%d"' % size, None
+        with lock:
+            item = objects.get((bucket, key))
+        if item is None:
+            return None
+        return len(item[0]), item[1], item[0]
+
+    def do_HEAD(self):
+        bucket, key, query = self.parse()
+        item = self.lookup(bucket, key)
+        if item is None:
+            return self.reply(404)
+        self.reply(200, headers = {'ETag' : item[1],
+                                   'Content-Length' : str(item[0])})
+
+    def do_GET(self):
+        bucket, key, query = self.parse()
+        if 'upload_id' in query:
+            with lock:
+                parts = uploads.get(query['upload_id'])
+            if parts is None:
+                return self.reply(404, {'code' : 'upload_not_exists'})
+            return self.reply(200, {'object_parts' : [
+                    {'part_number' : n, 'size' : size, 'etag' : etag}
+                            for n, (size, etag) in sorted(parts.items())]})
+        if not key:
+            return self.reply(200, {'keys' : [], 'has_more' : False})
+
+        item = self.lookup(bucket, key)
+        if item is None:
+            return self.reply(404, {'code' : 'object_not_exists'})
+        size, etag, data = item
+        start, end, status = 0, size - 1, 200
+        ranges = self.headers.get('Range')
+        if ranges:
+            first, _, last = ranges.split('=', 1)[1].partition('-')
+            start  = int(first)
+            end    = min(int(last), size - 1) if last else size - 1
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        if data is not None:
+            self.wfile.write(data[start:end + 1])
+            return
+        offset = start
+        while offset <= end:
+            n = min(CHUNK - offset % CHUNK, end - offset + 1)
+            self.wfile.write(PATTERN[offset % CHUNK:offset % CHUNK + n])
+            offset += n
+
+    def do_PUT(self):
+        bucket, key, query = self.parse()
+        if 'upload_id' in query:
+            data, etag = self.read_body(keep = False)
+            with lock:
+                parts = uploads.get(query['upload_id'])
+                if parts is not None:
+                    parts[int(query['part_number'])] = (
+                        int(self.headers.get('Content-Length') or 0), etag)
+            if parts is None:
+                return self.reply(404, {'code' : 'upload_not_exists'})
+            return self.reply(201, headers = {'ETag' : etag})
+        if not key:
+            return self.reply(201)
+        data, etag = self.read_body()
+        with lock:
+            objects[(bucket, key)] = (data, etag)
+        self.reply(201, headers = {'ETag' : etag})
+
+    def do_POST(self):
+        bucket, key, query = self.parse()
+        self.read_body(keep = False)
+        if 'uploads' in query:
+            upload_id = hashlib.md5(('%s/%s/%f' % (bucket, key,
+                                    time.time())).encode()).hexdigest()
+            with lock:
+                uploads[upload_id] = {}
+            return self.reply(200, {'bucket' : bucket, 'key' : key,
+                                    'upload_id' : upload_id})
+        if 'upload_id' in query:
+            with lock:
+                parts = uploads.pop(query['upload_id'], None)
+            if parts is None:
+                return self.reply(404, {'code' : 'upload_not_exists'})
+            return self.reply(201)
+        self.reply(400, {'code' : 'invalid_request'})
+
+    def do_DELETE(self):
+        bucket, key, query = self.parse()
+        with lock:
+            if 'upload_id' in query:
+                uploads.pop(query['upload_id'], None)
+            else:
+                objects.pop((bucket, key), None)
+        self.reply(204)
+
+if __name__ == '__main__':
+    server = ThreadingHTTPServer(('127.0.0.1', int(sys.argv[1])), Handler)
+    server.daemon_threads = True
+    print('listening on %d' % server.server_port)
+    sys.stdout.flush()
+    server.serve_forever()
@@ -4,30 +4,1421 @@
 # one-file imp.  i'm sorry if that hurts your feelings
 # default config file: ~/.qingstor/config.yaml
 
+import io
 import os
 import sys
-from argparse   import ArgumentParser
-from difflib    import get_close_matches
+import json
+import time
+import random
+import base64
+import shlex
+import shutil
+import socket
+import stat
+import struct
+import hashlib
+import tempfile
+import threading
+from argparse               import ArgumentParser, ArgumentTypeError, Namespace
+from concurrent.futures     import ThreadPoolExecutor, as_completed
+from difflib                import get_close_matches
+from functools              import partial
+from queue                  import Queue
 
-from qingstor.sdk.service.qingstor  import QingStor
-from qingstor.sdk.service.bucket    import Bucket
-from qingstor.sdk.config            import Config
+# the sdk (and requests under it) takes most of the startup time, it is
+# only imported once an action is about to send a request
 
 # the server side READ, WRITE, FULL_CONTROL should be
 #   QC_RO, QC_WO, QC_RW respectively
 
 # global macros
 VERSION = '0.0.1 alpha rc1 rev2'
+CONFIG  = '~/.qingstor/config.yaml'
+
+# qs_cli forwards actions to a serve process listening on this socket
+SOCKET_ENV      = 'QS_CLI_SOCKET'
+SOCKET          = '~/.qingstor/qs_cli.sock'
 INDENT  = ' ' * 4
 NEWLINE = '\n' + INDENT
 
 BUFSIZE = 1024 * 1024 * 4
 
+# multipart defaults, part numbers start at 0 and a upload has 10000 at most
+PART_SIZE           = 1024 * 1024 * 32
+MULTIPART_THRESHOLD = 1024 * 1024 * 128
+MAX_PARTS           = 10000
+MAX_WORKERS         = 8
+
+# gc-multipart leaves younger uploads alone, they may still be running
+GC_AGE = 86400
+
+SIZE_UNITS = {'K' : 1 << 10, 'M' : 1 << 20, 'G' : 1 << 30, 'T' : 1 << 40}
+
 HTTP_OK                 = 200
 HTTP_OK_CREATED         = 201
 HTTP_OK_NO_CONTENT      = 204
 HTTP_OK_PARTIAL_CONTENT = 206
 
+HTTP_NOT_FOUND              = 404
+HTTP_METHOD_NOT_ALLOWED     = 405
+HTTP_PRECONDITION_FAILED    = 412
+HTTP_RANGE_NOT_SATISFIABLE  = 416
+HTTP_TOO_MANY_REQUESTS      = 429
+HTTP_NOT_IMPLEMENTED        = 501
+HTTP_SERVICE_UNAVAILABLE    = 503
+
+# retry defaults, the n-th retry waits a random time up to
+# min(BACKOFF_MAX, BACKOFF_BASE * 2 ** n) seconds
+RETRIES         = 3
+BACKOFF_BASE    = 0.2
+BACKOFF_MAX     = 20
+
+# keys per multi-object delete request
+DELETE_BATCH = 1000
+
+# finished parts and ranges of interrupted transfers are kept here
+JOURNAL_DIR = '~/.qingstor/journal'
+
+# head-object and head-bucket answers are kept here with --cache, entries
+# older than the ttl are not used and the least recently used are evicted
+CACHE_DB    = '~/.qingstor/cache.db'
+CACHE_TTL   = 300
+CACHE_SIZE  = 10000
+
+# etags of local files by path, size, mtime and part size, so unchanged
+# files are not hashed again
+HASH_DB     = '~/.qingstor/hashes.db'
+
+# throttled bodies take their bytes from the limit this many at once, a
+# limit file is checked for changes at most every THROTTLE_CHECK seconds
+THROTTLE_CHUNK  = 1024 * 256
+THROTTLE_CHECK  = 1
+
+# batch --async sends file bodies this many bytes at once, so memory stays
+# at one chunk per operation in flight
+ASYNC_CHUNK = 1024 * 64
+
+# --compress codecs and the packages they need, objects are compressed in
+# chunks of COMPRESS_CHUNK, each a frame of its own, the codec is kept in
+# the codec metadata (X-QS-Meta-Codec)
+CODECS          = {'gzip' : 'zlib', 'zstd' : 'zstandard', 'lz4' : 'lz4'}
+CODEC_META      = 'codec'
+COMPRESS_CHUNK  = 1024 * 1024 * 4
+
+# upper bounds in seconds of the latency histograms of --metrics
+TRACE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 
+                 30, 60)
+
+# seconds between two progress bar redraws or json progress events
+PROGRESS_INTERVAL = 0.5
+
+# local listings of whole buckets built by the index action
+INDEX_DIR   = '~/.qingstor/index'
+INDEX_BATCH = 1000
+
+AGE_UNITS = {'S' : 1, 'M' : 60, 'H' : 3600, 'D' : 86400, 'W' : 604800}
+
+
+def parse_size(value):
+    # '4096', '64K', '32M', '1G' -> number of bytes
+    value = value.strip().upper().rstrip('B')
+    unit  = 1
+    if value and value[-1] in SIZE_UNITS:
+        unit  = SIZE_UNITS[value[-1]]
+        value = value[:-1]
+    try:
+        size = int(float(value) * unit)
+    except ValueError:
+        raise ArgumentTypeError('invalid size %s' % value)
+    if size <= 0:
+        raise ArgumentTypeError('size must be positive')
+    return size
+
+def format_size(size):
+    # number of bytes -> '512', '1.5K', '32.0M', the reverse of parse_size
+    for unit in 'TGMK':
+        if size >= SIZE_UNITS[unit]:
+            return '%.1f%s' % (size / SIZE_UNITS[unit], unit)
+    return '%d' % size
+
+def parse_age(value):
+    # '90', '30m', '12h', '7d' -> number of seconds
+    value = value.strip().upper()
+    unit  = 1
+    if value and value[-1] in AGE_UNITS:
+        unit  = AGE_UNITS[value[-1]]
+        value = value[:-1]
+    try:
+        return int(float(value) * unit)
+    except ValueError:
+        raise ArgumentTypeError('invalid age %s' % value)
+
+def get_part_ranges(size, part_size):
+    # split size bytes into (part_number, offset, length) tuples, the part
+    # size grows when the object would need more than MAX_PARTS parts
+    part_size = max(part_size, -(-size // MAX_PARTS))
+    return [(n, offset, min(part_size, size - offset))
+                for n, offset in enumerate(range(0, size, part_size))]
+
+def add_multipart_arguments(parser):
+    parser.add_argument(
+        '-j', 
+        '--jobs', 
+        dest    = 'jobs', 
+        type    = int, 
+        default = MAX_WORKERS, 
+        help    = 'How many parts to upload at the same time', 
+    )
+    parser.add_argument(
+        '--part-size', 
+        dest    = 'part_size', 
+        type    = parse_size, 
+        default = PART_SIZE, 
+        help    = 'The size of each part in a multipart upload', 
+    )
+    parser.add_argument(
+        '--multipart-threshold', 
+        dest    = 'threshold', 
+        type    = parse_size, 
+        default = MULTIPART_THRESHOLD, 
+        help    = 'Files larger than this are uploaded in parts', 
+    )
+
+def add_progress_arguments(parser):
+    parser.add_argument(
+        '--progress', 
+        dest    = 'progress', 
+        action  = 'store_true', 
+        help    = 'Show a progress bar when stderr is a terminal', 
+    )
+    parser.add_argument(
+        '--progress-fd', 
+        dest    = 'progress_fd', 
+        type    = int, 
+        help    = 'Write progress events to this file descriptor, '
+                  'one json object per line', 
+    )
+
+def get_progress(options, name, total = None):
+    # None when no progress is asked for, so the hooks cost nothing
+    if not options.progress and options.progress_fd is None:
+        return None
+    return Progress(name, total, options.progress, options.progress_fd)
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes   = divmod(minutes, 60)
+    if hours:
+        return '%d:%02d:%02d' % (hours, minutes, seconds)
+    return '%d:%02d' % (minutes, seconds)
+
+def backoff_delay(attempt):
+    # exponential backoff with full jitter
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def parse_range(value):
+    # 'a-b' or 'a-' -> (a, b or None), suffix ranges like '-n' -> None
+    if not value:
+        return 0, None
+    start, _, end = value.partition('-')
+    if not start:
+        return None
+    return int(start), int(end) if end else None
+
+def file_fingerprint(path):
+    st = os.stat(path)
+    return '%s:%d:%d' % (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+
+def part_etag(path, offset, length):
+    # the etag the server reports for a part holding these bytes
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while length > 0:
+            buf = f.read(min(length, BUFSIZE))
+            if not buf: break
+            md5.update(buf)
+            length -= len(buf)
+    return '"%s"' % md5.hexdigest()
+
+def etag_part_size(etag, size, part_size):
+    # the part size a multipart etag ("<md5>-<parts>") was made with,
+    # part_size when it fits, None for the etag of a single put
+    md5, _, parts = etag.strip('"').rpartition('-')
+    if not md5 or not parts.isdigit():
+        return None
+    parts = int(parts)
+    if len(get_part_ranges(size, part_size)) == parts:
+        return part_size
+    # uploaded with another part size, most tools use whole megabytes
+    unit = 1 << 20
+    return max(unit, (-(-size // parts) + unit - 1) // unit * unit)
+
+def hash_file(path, part_size = None):
+    # the etag of the file put at once, or uploaded in parts of part_size,
+    # i.e. the md5 of the part md5s followed by the number of parts
+    if not part_size:
+        return part_etag(path, 0, os.path.getsize(path))
+    digests = []
+    with open(path, 'rb') as f:
+        for n, offset, length in get_part_ranges(os.path.getsize(path), 
+                                                 part_size):
+            md5 = hashlib.md5()
+            while length > 0:
+                buf = f.read(min(length, BUFSIZE))
+                if not buf: break
+                md5.update(buf)
+                length -= len(buf)
+            digests.append(md5.digest())
+    return '"%s-%d"' % (hashlib.md5(b''.join(digests)).hexdigest(), 
+                        len(digests))
+
+def local_etag(path, etag, part_size):
+    # the local counterpart of a remote etag, from the hash cache when
+    # the file did not change since it was last hashed
+    st        = os.stat(path)
+    part_size = etag_part_size(etag, st.st_size, part_size) or 0
+    cache     = HashCache()
+    local     = cache.get(path, st.st_size, st.st_mtime_ns, part_size)
+    if local is None:
+        local = hash_file(path, part_size)
+        cache.put(path, st.st_size, st.st_mtime_ns, part_size, local)
+    return local
+
+def same_etag(a, b):
+    return a is not None and b is not None and \
+            a.strip('"').lower() == b.strip('"').lower()
+
+def load_codec(name):
+    # (compress(data), new decompress object) of a codec, exits when its
+    # package is not installed
+    try:
+        if name == 'gzip':
+            import zlib
+            def compress(data):
+                obj = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+                return obj.compress(data) + obj.flush()
+            return compress, partial(zlib.decompressobj, 16 + zlib.MAX_WBITS)
+        if name == 'zstd':
+            import zstandard
+            return (lambda data: zstandard.ZstdCompressor().compress(data), 
+                    lambda: zstandard.ZstdDecompressor().decompressobj())
+        if name == 'lz4':
+            import lz4.frame
+            return lz4.frame.compress, lz4.frame.LZ4FrameDecompressor
+    except ImportError:
+        pass
+    print('[ERROR] the %s codec needs the %s package' 
+                                    % (name, CODECS.get(name, name)))
+    sys.exit(-1)
+
+def read_full(stream, view):
+    # fills view from stream, returns fewer bytes only at the end of it
+    done = 0
+    while done < len(view):
+        n = stream.readinto(view[done:])
+        if not n:
+            break
+        done += n
+    return done
+
+def pass_output():
+    # returns a function giving the thread it runs in the output redirects
+    # of the calling one, so the workers of a command run by serve or batch
+    # print to that command's client
+    redirects = [(stream, getattr(stream.local, 'target', None)) 
+                    for stream in (sys.stdout, sys.stderr) 
+                                    if isinstance(stream, ThreadOutput)]
+    def apply():
+        for stream, target in redirects:
+            stream.redirect(target)
+    return apply
+
+def worker_pool(jobs):
+    # a thread pool whose workers print where the calling thread does
+    return ThreadPoolExecutor(max_workers = jobs, initializer = pass_output())
+
+def run_bounded(jobs, items, work, done):
+    # runs work(item) for the items of any iterable on jobs workers, taking
+    # at most 2 * jobs items ahead of them. done(item, result, error) is
+    # called for every item, one at a time
+    pending = threading.BoundedSemaphore(jobs * 2)
+    lock    = threading.Lock()
+
+    def finish(future, item):
+        try:
+            result, error = future.result(), None
+        except Exception as e:
+            result, error = None, e
+        try:
+            with lock:
+                done(item, result, error)
+        finally:
+            pending.release()
+
+    with worker_pool(jobs) as pool:
+        for item in items:
+            pending.acquire()
+            pool.submit(work, item).add_done_callback(
+                                    lambda f, item = item: finish(f, item))
+
+def prefetch(iterable, depth = 1):
+    # drives iterable from a background thread, at most depth items ahead
+    queue  = Queue(depth)
+    end    = object()
+    output = pass_output()
+
+    def produce():
+        output()
+        try:
+            for item in iterable:
+                queue.put((item, None))
+            queue.put((end, None))
+        except Exception as e:
+            queue.put((end, e))
+
+    threading.Thread(target = produce, daemon = True).start()
+    while True:
+        item, error = queue.get()
+        if item is end:
+            if error: raise error
+            return
+        yield item
+
+def list_object_pages(bucket, prefix = None, delimiter = None, marker = None, 
+                      limit = None):
+    # yields the response of every page, following next_marker
+    while True:
+        resp = BaseAction.call(bucket.list_objects, 
+                    delimiter = delimiter, 
+                    limit     = str(limit) if limit else None, 
+                    marker    = marker, 
+                    prefix    = prefix, 
+                )
+        if resp.status_code != HTTP_OK:
+            raise IOError('%s %s %s' % (resp.status_code, resp.res.reason, 
+                                        resp.content.decode()))
+        yield resp
+        marker = resp.get('next_marker')
+        if not marker:
+            return
+
+def list_all_objects(bucket, prefix = None, delimiter = None, marker = None, 
+                     limit = None):
+    # yields the keys of every page
+    for page in list_object_pages(bucket, prefix, delimiter, marker, limit):
+        for key in page.get('keys') or []:
+            yield key
+
+def list_uploaded_parts(bucket, key, upload_id):
+    # part_number -> (size, etag) of the parts the server already has,
+    # None when the upload does not exist any more, IOError on other errors
+    parts  = {}
+    marker = None
+    while True:
+        resp = BaseAction.call(bucket.list_multipart, 
+                    key, 
+                    part_number_marker = marker, 
+                    upload_id          = upload_id, 
+                )
+        if resp.status_code == HTTP_NOT_FOUND:
+            return None
+        if resp.status_code != HTTP_OK:
+            raise IOError('%s %s %s' % (resp.status_code, resp.res.reason, 
+                                        resp.content.decode()))
+        for part in resp.get('object_parts') or []:
+            parts[part['part_number']] = (part['size'], part.get('etag'))
+        marker = resp.get('next_part_number_marker')
+        if not marker:
+            return parts
+        marker = str(marker)
+
+def list_multipart_uploads(bucket, prefix = None):
+    # yields the in progress uploads of the bucket, following the key and
+    # upload id markers
+    key_marker, upload_id_marker = None, None
+    while True:
+        resp = BaseAction.call(bucket.list_multipart_uploads, 
+                    key_marker       = key_marker, 
+                    prefix           = prefix, 
+                    upload_id_marker = upload_id_marker, 
+                )
+        if resp.status_code != HTTP_OK:
+            raise IOError('%s %s %s' % (resp.status_code, resp.res.reason, 
+                                        resp.content.decode()))
+        for upload in resp.get('uploads') or []:
+            yield upload
+        key_marker       = resp.get('next_key_marker')
+        upload_id_marker = resp.get('next_upload_id_marker')
+        if not resp.get('has_more') or not key_marker:
+            return
+
+
+class ThreadOutput(object):
+    # stands in for sys.stdout, threads that redirect their output write
+    # to their own stream and everyone else to the real one
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local  = threading.local()
+
+    def redirect(self, target):
+        self.local.target = target
+
+    def __getattr__(self, name):
+        target = getattr(self.local, 'target', None) or self.stream
+        return getattr(target, name)
+
+
+class SocketOutput(object):
+    # file like object sending what is written to a socket, as frames of
+    # one channel byte, a 4 byte length and the data
+
+    def __init__(self, sock, channel):
+        self.sock    = sock
+        self.channel = channel
+
+    @property
+    def buffer(self):
+        return self
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.sock.sendall(self.channel + struct.pack('>I', len(data)) + data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+class AsyncTransport(object):
+    # sends requests built and signed by the sdk over aiohttp, so thousands
+    # of small operations can be in flight without a thread each
+
+    def __init__(self, session):
+        self.session = session
+
+    async def send(self, request, sink = None):
+        # returns (status, reason, headers, body), with a sink a successful
+        # body is written to it instead of being returned
+        import asyncio
+        import aiohttp
+        from yarl import URL
+
+        throttle = BaseAction.throttle
+        start    = time.time()
+        attempt  = 0
+        while True:
+            prepared = request.sign()
+            body     = prepared.body
+            if hasattr(body, 'read'):
+                body = self.stream(body)
+            if throttle.active:
+                await asyncio.sleep(throttle.reserve_request() + 
+                        throttle.reserve_bytes(int(
+                            prepared.headers.get('Content-Length') or 0)))
+            try:
+                async with self.session.request(
+                        prepared.method, 
+                        URL(prepared.url, encoded = True), 
+                        headers = dict(prepared.headers), 
+                        data    = body, 
+                    ) as resp:
+                    retry = resp.status >= 500 \
+                                or resp.status == HTTP_TOO_MANY_REQUESTS
+                    if not retry or attempt >= BaseAction.retries:
+                        if sink and resp.status in (HTTP_OK, 
+                                                    HTTP_OK_PARTIAL_CONTENT):
+                            sink.seek(0)
+                            sink.truncate()
+                            async for chunk in resp.content.iter_chunked(
+                                    throttle.active and THROTTLE_CHUNK 
+                                                    or BUFSIZE):
+                                if throttle.active:
+                                    await asyncio.sleep(
+                                        throttle.reserve_bytes(len(chunk)))
+                                sink.write(chunk)
+                            body = b''
+                        else:
+                            body = await resp.read()
+                        return resp.status, resp.reason, resp.headers, body
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt >= BaseAction.retries:
+                    raise
+
+            attempt += 1
+            delay    = backoff_delay(attempt)
+            if BaseAction.deadline is not None and \
+                    time.time() + delay - start > BaseAction.deadline:
+                raise IOError('deadline exceeded after %d attempts' % attempt)
+            with BaseAction.retry_lock:
+                BaseAction.retry_stats['retries'] += 1
+                BaseAction.retry_stats['delay']   += delay
+            await asyncio.sleep(delay)
+
+    async def stream(self, body):
+        # a file body from its start, read off the event loop
+        import asyncio
+        loop = asyncio.get_running_loop()
+        body.seek(0)
+        while True:
+            chunk = await loop.run_in_executor(None, body.read, ASYNC_CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+
+class Progress(object):
+    # bytes done, throughput and eta of a transfer, drawn as a bar on
+    # stderr and/or written as json events to a file descriptor. the
+    # transfer only adds to a counter, a ticker thread does the output, so
+    # a stalled transfer still shows up, with a rate of 0
+
+    def __init__(self, name, total = None, bar = False, fd = None):
+        self.name     = name
+        self.total    = total
+        self.bar      = bar and sys.stderr.isatty()
+        self.fd       = fd
+        self.done     = 0
+        self.rate     = 0.0
+        self.start    = time.time()
+        self.stamp    = (self.start, 0)
+        self.latency  = []
+        self.lock     = threading.Lock()
+        self.finished = threading.Event()
+        self.output   = pass_output()
+        self.ticker   = threading.Thread(target = self.tick, daemon = True)
+        self.ticker.start()
+
+    def update(self, amount):
+        with self.lock:
+            self.done += amount
+
+    def part(self, number, size, latency):
+        # a finished part or range of a multipart transfer
+        with self.lock:
+            self.latency.append(latency)
+        self.emit({'event' : 'part', 'name' : self.name, 'part' : number, 
+                   'bytes' : size, 'latency' : round(latency, 6)})
+
+    def snapshot(self):
+        now   = time.time()
+        stamp = self.stamp
+        # smoothed rate over the last intervals
+        rate  = (self.done - stamp[1]) / max(now - stamp[0], 1e-6)
+        self.rate  = rate if not self.rate else 0.3 * rate + 0.7 * self.rate
+        self.stamp = (now, self.done)
+        event = {
+            'event'   : 'progress', 
+            'name'    : self.name, 
+            'bytes'   : self.done, 
+            'total'   : self.total, 
+            'rate'    : int(self.rate), 
+            'average' : int(self.done / max(now - self.start, 1e-6)), 
+            'eta'     : None, 
+        }
+        if self.total is not None and self.rate > 0:
+            event['eta'] = round((self.total - self.done) / self.rate, 1)
+        return event
+
+    def emit(self, event):
+        if self.fd is None:
+            return
+        try:
+            os.write(self.fd, (json.dumps(event) + '\n').encode())
+        except OSError:
+            self.fd = None
+
+    def draw(self, event, end = ''):
+        if not self.bar:
+            return
+        width = shutil.get_terminal_size().columns
+        info  = ' %s %s/s' % (format_size(event['bytes']), 
+                              format_size(event['rate']))
+        if self.total:
+            info = ' %5.1f%%%s ETA %s' % (100.0 * event['bytes'] / self.total, 
+                    info, '--:--' if event['eta'] is None 
+                                    else format_duration(event['eta']))
+            size = max(10, min(40, width - len(self.name) - len(info) - 4))
+            fill = size * event['bytes'] // self.total
+            info = ' [%s%s]%s' % ('#' * fill, '-' * (size - fill), info)
+        sys.stderr.write(('\r%s%s' % (self.name, info))[:width] 
+                                                    + '\x1b[K' + end)
+        sys.stderr.flush()
+
+    def tick(self):
+        self.output()
+        while not self.finished.wait(PROGRESS_INTERVAL):
+            with self.lock:
+                event = self.snapshot()
+            self.emit(event)
+            self.draw(event)
+
+    def finish(self, ok = True):
+        self.finished.set()
+        self.ticker.join()
+        with self.lock:
+            event   = self.snapshot()
+            latency = sorted(self.latency)
+        elapsed = time.time() - self.start
+        event['rate'] = event['average']
+        self.draw(event, '\n')
+        done = {'event' : 'done', 'name' : self.name, 'ok' : ok, 
+                'bytes' : self.done, 'seconds' : round(elapsed, 3), 
+                'average' : event['average']}
+        if latency:
+            done['parts'] = {
+                'count' : len(latency), 
+                'min'   : round(latency[0], 6), 
+                'p50'   : round(latency[len(latency) // 2], 6), 
+                'p95'   : round(latency[int(len(latency) * 0.95)], 6), 
+                'max'   : round(latency[-1], 6), 
+            }
+        self.emit(done)
+
+
+class TokenBucket(object):
+    # rate tokens per second with a burst of one second. takers go into
+    # debt and wait until it is paid back, with a path the tokens are kept
+    # in that file under flock and shared by every process using it
+
+    def __init__(self, rate = None, path = None):
+        self.rate   = rate
+        self.path   = path
+        self.tokens = 0
+        self.stamp  = time.time()
+        self.lock   = threading.Lock()
+
+    def refill(self, tokens, stamp, amount):
+        now = time.time()
+        return min(self.rate, tokens + (now - stamp) * self.rate) - amount, now
+
+    def reserve_shared(self, amount):
+        import fcntl
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                state = json.loads(os.pread(fd, 4096, 0).decode())
+                tokens, stamp = state['tokens'], state['stamp']
+            except (ValueError, KeyError, TypeError):
+                tokens, stamp = 0, time.time()
+            tokens, stamp = self.refill(tokens, stamp, amount)
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, json.dumps({'tokens' : tokens, 
+                                      'stamp'  : stamp}).encode(), 0)
+        finally:
+            os.close(fd)
+        return tokens
+
+    def reserve(self, amount):
+        # takes amount tokens, returns how long the taker has to wait
+        rate = self.rate
+        if not rate:
+            return 0
+        with self.lock:
+            if self.path:
+                tokens = self.reserve_shared(amount)
+            else:
+                self.tokens, self.stamp = self.refill(self.tokens, 
+                                                      self.stamp, amount)
+                tokens = self.tokens
+        return max(0, -tokens / rate)
+
+
+class Throttle(object):
+    # the byte and request limits of the process. limits in the json file
+    # of --limit-file ({"rate": "10M", "requests": 50}) override the
+    # command line and are picked up while running, processes using the
+    # same file share the limits
+
+    def __init__(self):
+        self.bytes    = TokenBucket()
+        self.requests = TokenBucket()
+        self.path     = None
+        self.limits   = (None, None)
+        self.mtime    = None
+        self.checked  = 0
+        self.stats    = {'bytes' : 0, 'requests' : 0, 'start' : None}
+        self.lock     = threading.Lock()
+
+    @property
+    def active(self):
+        return bool(self.bytes.rate or self.requests.rate or self.path)
+
+    def configure(self, rate, requests, path):
+        self.stats   = {'bytes' : 0, 'requests' : 0, 'start' : None}
+        self.limits  = (rate, requests)
+        self.path    = path and os.path.abspath(os.path.expanduser(path))
+        self.mtime   = None
+        self.checked = 0
+        self.bytes.path    = self.path and self.path + '.bytes'
+        self.requests.path = self.path and self.path + '.requests'
+        self.bytes.rate, self.requests.rate = self.limits
+        self.check()
+
+    def check(self):
+        # reloads the limit file when it changed
+        if not self.path:
+            return
+        now = time.time()
+        with self.lock:
+            if now - self.checked < THROTTLE_CHECK:
+                return
+            self.checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime == self.mtime:
+                return
+            self.mtime = mtime
+            rate, requests = self.limits
+            if mtime is not None:
+                try:
+                    with open(self.path) as f:
+                        limits = json.load(f)
+                    if limits.get('rate') is not None:
+                        rate = parse_size(str(limits['rate']))
+                    if limits.get('requests') is not None:
+                        requests = float(limits['requests'])
+                except (IOError, ValueError, ArgumentTypeError, 
+                        AttributeError) as e:
+                    sys.stderr.write('[WARN] ignoring limit file %s: %s\n' 
+                                                        % (self.path, e))
+                    return
+            self.bytes.rate, self.requests.rate = rate, requests
+
+    def count(self, name, amount):
+        with self.lock:
+            if self.stats['start'] is None:
+                self.stats['start'] = time.time()
+            self.stats[name] += amount
+
+    def reserve_bytes(self, amount):
+        self.check()
+        self.count('bytes', amount)
+        return self.bytes.reserve(amount)
+
+    def reserve_request(self):
+        self.check()
+        self.count('requests', 1)
+        return self.requests.reserve(1)
+
+    def take_bytes(self, amount):
+        time.sleep(self.reserve_bytes(amount))
+
+    def take_request(self):
+        time.sleep(self.reserve_request())
+
+    def report(self):
+        # achieved against target throughput, on stderr
+        if not self.active or self.stats['start'] is None:
+            return
+        elapsed = max(time.time() - self.stats['start'], 1e-3)
+        rates   = []
+        if self.bytes.rate or self.stats['bytes']:
+            rates.append('%s/s of %s/s' % (
+                format_size(self.stats['bytes'] / elapsed), 
+                format_size(self.bytes.rate) if self.bytes.rate else 'any'))
+        rates.append('%.1f of %s requests/s' % (
+                self.stats['requests'] / elapsed, 
+                '%g' % self.requests.rate if self.requests.rate else 'any'))
+        sys.stderr.write('[INFO] %s\n' % ', '.join(rates))
+
+
+class Tracer(object):
+    # timings of every sdk call by operation and zone: dns, connect, tls
+    # (only for new connections), ttfb (request sent to response headers,
+    # from requests' elapsed), total and the body of streamed responses.
+    # --trace appends one json object per attempt, --metrics keeps
+    # cumulative histograms and counters in a json file next to it and
+    # rewrites it in prometheus text format at exit
+
+    local = threading.local()
+
+    def __init__(self):
+        self.trace     = None
+        self.metrics   = None
+        self.installed = False
+        self.series    = {}
+        self.lock      = threading.Lock()
+
+    @property
+    def active(self):
+        return bool(self.trace or self.metrics)
+
+    def configure(self, trace, metrics):
+        self.trace   = trace and os.path.expanduser(trace)
+        self.metrics = metrics and os.path.expanduser(metrics)
+        if self.active and not self.installed:
+            self.install()
+
+    def install(self):
+        # the dns, connect and tls timings of the current thread's call
+        from urllib3 import connection
+        local       = self.local
+        getaddrinfo = socket.getaddrinfo
+        new_conn    = connection.HTTPConnection._new_conn
+        connect     = connection.HTTPSConnection.connect
+
+        def timed_getaddrinfo(*args, **kwargs):
+            start = time.time()
+            try:
+                return getaddrinfo(*args, **kwargs)
+            finally:
+                phases = getattr(local, 'phases', None)
+                if phases is not None:
+                    phases['dns'] = phases.get('dns', 0) + time.time() - start
+
+        def timed_new_conn(conn):
+            phases = getattr(local, 'phases', None)
+            if phases is None:
+                return new_conn(conn)
+            start = time.time()
+            dns   = phases.get('dns', 0)
+            try:
+                return new_conn(conn)
+            finally:
+                elapsed = time.time() - start
+                phases['socket']  = elapsed
+                phases['connect'] = elapsed - phases.get('dns', 0) + dns
+
+        def timed_connect(conn):
+            phases = getattr(local, 'phases', None)
+            if phases is None:
+                return connect(conn)
+            start = time.time()
+            try:
+                return connect(conn)
+            finally:
+                phases['tls'] = time.time() - start - phases.get('socket', 0)
+
+        socket.getaddrinfo                  = timed_getaddrinfo
+        connection.HTTPConnection._new_conn = timed_new_conn
+        connection.HTTPSConnection.connect  = timed_connect
+        self.installed = True
+
+    def body_size(self, body):
+        if body is None:
+            return 0
+        from requests.utils import super_len
+        try:
+            return super_len(body)
+        except Exception:
+            return 0
+
+    def begin(self):
+        self.local.phases = {}
+        self.local.start  = time.time()
+
+    def observe(self, name, labels, value = None, amount = 1):
+        # a histogram when value is given, a counter otherwise
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if value is None:
+                self.series[key] = self.series.get(key, 0) + amount
+                return
+            series = self.series.setdefault(key, 
+                    {'buckets' : [0] * len(TRACE_BUCKETS), 
+                     'sum' : 0.0, 'count' : 0})
+            for i, bound in enumerate(TRACE_BUCKETS):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum']   += value
+            series['count'] += 1
+
+    def record(self, method, resp, error, attempt, sent):
+        # one attempt of an sdk call, right after it returned
+        total  = time.time() - self.local.start
+        phases = self.local.phases
+        self.local.phases = None
+        owner  = getattr(method, '__self__', None)
+        labels = {
+            'operation' : getattr(method, '__name__', 'unknown'), 
+            'zone'      : getattr(owner, 'properties', {}).get('zone') or '', 
+        }
+        status = resp.status_code if resp is not None else 'error'
+        timing = dict((name, phases[name]) for name in ('dns', 'connect', 
+                                                'tls') if name in phases)
+        timing['total'] = total
+        received = 0
+        if resp is not None:
+            resp.trace_labels = labels
+            timing['ttfb'] = resp.res.elapsed.total_seconds()
+            # the length of a head answer is the object's, with no body
+            if resp.res.request.method != 'HEAD':
+                received = int(resp.headers.get('Content-Length') or 0)
+
+        if self.metrics:
+            for phase, value in timing.items():
+                self.observe('qs_cli_request_seconds', 
+                             dict(labels, phase = phase), value)
+            self.observe('qs_cli_requests_total', 
+                         dict(labels, status = str(status)))
+            if attempt:
+                self.observe('qs_cli_request_retries_total', labels)
+            self.observe('qs_cli_request_bytes_total', 
+                         dict(labels, direction = 'out'), amount = sent)
+            self.observe('qs_cli_request_bytes_total', 
+                         dict(labels, direction = 'in'), amount = received)
+
+        if self.trace:
+            from urllib.parse import unquote, urlparse
+            event = dict(labels, time = round(self.local.start, 6), 
+                         status = status, attempt = attempt, 
+                         bytes_out = sent, bytes_in = received)
+            if resp is not None:
+                event['path'] = unquote(urlparse(resp.res.url).path)
+            else:
+                event['error'] = str(error)
+            event.update((k, round(v, 6)) for k, v in timing.items())
+            with self.lock:
+                with open(self.trace, 'a') as f:
+                    f.write(json.dumps(event) + '\n')
+
+    def record_body(self, resp, seconds):
+        # reading the body of a streamed response, after record
+        labels = getattr(resp, 'trace_labels', None)
+        if self.metrics and labels:
+            self.observe('qs_cli_request_seconds', 
+                         dict(labels, phase = 'body'), seconds)
+
+    def flush(self):
+        # adds this process' series to the json state and rewrites the
+        # metrics file, both under flock so processes can share them
+        if not self.metrics:
+            return
+        import fcntl
+        with self.lock:
+            series, self.series = self.series, {}
+        if not series:
+            return
+        directory = os.path.dirname(os.path.abspath(self.metrics))
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok = True)
+        with open(self.metrics + '.json', 'a+') as state:
+            fcntl.flock(state, fcntl.LOCK_EX)
+            state.seek(0)
+            try:
+                saved = json.loads(state.read() or '[]')
+            except ValueError:
+                saved = []
+            merged = dict(((name, tuple(tuple(l) for l in labels)), value) 
+                                        for name, labels, value in saved)
+            for key, value in series.items():
+                old = merged.get(key)
+                if isinstance(value, dict):
+                    if isinstance(old, dict) and \
+                            len(old['buckets']) == len(value['buckets']):
+                        value = {
+                            'buckets' : [a + b for a, b in zip(
+                                    old['buckets'], value['buckets'])], 
+                            'sum'     : old['sum'] + value['sum'], 
+                            'count'   : old['count'] + value['count'], 
+                        }
+                elif isinstance(old, (int, float)):
+                    value += old
+                merged[key] = value
+
+            tmp = '%s.%d.tmp' % (self.metrics, os.getpid())
+            with open(tmp, 'w') as f:
+                f.write(self.render(merged))
+            os.replace(tmp, self.metrics)
+
+            state.seek(0)
+            state.truncate()
+            state.write(json.dumps([[name, labels, value] for 
+                        (name, labels), value in sorted(merged.items())]))
+
+    def render(self, series):
+        # prometheus text format, as read by the textfile collector
+        helps = {
+            'qs_cli_request_seconds' : 
+                    ('histogram', 'Seconds spent in each phase of requests'), 
+            'qs_cli_requests_total' : 
+                    ('counter', 'Requests by status'), 
+            'qs_cli_request_retries_total' : 
+                    ('counter', 'Retried requests'), 
+            'qs_cli_request_bytes_total' : 
+                    ('counter', 'Request and response body bytes'), 
+        }
+        def format_labels(labels, extra = ()):
+            return '{%s}' % ','.join('%s="%s"' % (name, str(value)
+                        .replace('\\', '\\\\').replace('"', '\\"'))
+                                    for name, value in tuple(labels) + extra)
+
+        lines = []
+        for metric in sorted(set(name for name, labels in series)):
+            kind, text = helps.get(metric, ('untyped', metric))
+            lines.append('# HELP %s %s' % (metric, text))
+            lines.append('# TYPE %s %s' % (metric, kind))
+            for (name, labels), value in sorted(series.items()):
+                if name != metric:
+                    continue
+                if not isinstance(value, dict):
+                    lines.append('%s%s %s' % (name, format_labels(labels), 
+                                              value))
+                    continue
+                for bound, count in zip(TRACE_BUCKETS, value['buckets']):
+                    lines.append('%s_bucket%s %d' % (name, format_labels(
+                                labels, (('le', '%g' % bound), )), count))
+                lines.append('%s_bucket%s %d' % (name, format_labels(
+                                labels, (('le', '+Inf'), )), value['count']))
+                lines.append('%s_sum%s %s' % (name, format_labels(labels), 
+                                              repr(value['sum'])))
+                lines.append('%s_count%s %d' % (name, format_labels(labels), 
+                                                value['count']))
+        return '\n'.join(lines) + '\n'
+
+
+class FileSlice(object):
+    # read only file-like view of length bytes at offset of a file, read
+    # with pread, so parts of one file are sent straight from it without
+    # being loaded or copied. it has a length but no fileno, so requests
+    # sends exactly the slice and not the rest of the file
+
+    def __init__(self, path, offset, length):
+        self.fd       = os.open(path, os.O_RDONLY)
+        self.offset   = offset
+        self.length   = length
+        self.position = 0
+
+    def __len__(self):
+        return self.length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, size = -1):
+        left = self.length - self.position
+        if size is None or size < 0 or size > left:
+            size = left
+        if size <= 0:
+            return b''
+        data = os.pread(self.fd, size, self.offset + self.position)
+        self.position += len(data)
+        return data
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence = os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.length
+        self.position = max(0, offset)
+        return self.position
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class BufferSlice(FileSlice):
+    # FileSlice over a memoryview, for parts read from a pipe
+
+    def __init__(self, view):
+        self.fd       = None
+        self.view     = view
+        self.offset   = 0
+        self.length   = len(view)
+        self.position = 0
+
+    def read(self, size = -1):
+        left = self.length - self.position
+        if size is None or size < 0 or size > left:
+            size = left
+        data = bytes(self.view[self.position:self.position + size])
+        self.position += len(data)
+        return data
+
+
+class CompressedReader(object):
+    # readinto() stream of source compressed chunk by chunk on a pool of
+    # jobs threads (the codecs release the gil), at most 2 x jobs chunks
+    # ahead of the reader. every chunk is a frame of its own
+
+    def __init__(self, source, compress, jobs):
+        self.source   = source
+        self.compress = compress
+        self.pool     = worker_pool(max(1, jobs))
+        self.window   = []
+        self.buffer   = b''
+        self.offset   = 0
+        self.eof      = False
+        for i in range(max(1, jobs) * 2):
+            self.submit()
+
+    def submit(self):
+        if self.eof:
+            return
+        data = self.source.read(COMPRESS_CHUNK)
+        if not data:
+            self.eof = True
+            return
+        self.window.append(self.pool.submit(self.compress, data))
+
+    def readinto(self, view):
+        done = 0
+        while done < len(view):
+            if self.offset == len(self.buffer):
+                if not self.window:
+                    break
+                self.buffer = self.window.pop(0).result()
+                self.offset = 0
+                self.submit()
+                continue
+            n = min(len(view) - done, len(self.buffer) - self.offset)
+            view[done:done + n] = self.buffer[self.offset:self.offset + n]
+            self.offset += n
+            done        += n
+        return done
+
+    def close(self):
+        for f in self.window: f.cancel()
+        self.pool.shutdown()
+
+
+class Decoder(object):
+    # decodes the concatenated frames (gzip members) of a codec
+
+    def __init__(self, codec):
+        self.new = load_codec(codec)[1]
+        self.obj = self.new()
+
+    def decode(self, data):
+        out = []
+        while data:
+            out.append(self.obj.decompress(data))
+            if not self.obj.eof:
+                break
+            data     = self.obj.unused_data
+            self.obj = self.new()
+        return b''.join(out)
+
+
+class ThrottledReader(object):
+    # file-like request body taking the bytes read from the throttle
+
+    def __init__(self, body, throttle):
+        if isinstance(body, str):
+            body = body.encode()
+        if isinstance(body, (bytes, bytearray)):
+            body = io.BytesIO(body)
+        self.body     = body
+        self.throttle = throttle
+        self.pending  = 0
+        position      = body.tell()
+        self.length   = body.seek(0, os.SEEK_END)
+        body.seek(position)
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size = -1):
+        data = self.body.read(size)
+        self.pending += len(data)
+        if self.pending >= THROTTLE_CHUNK or not data:
+            self.throttle.take_bytes(self.pending)
+            self.pending = 0
+        return data
+
+    def tell(self):
+        return self.body.tell()
+
+    def seek(self, offset, whence = os.SEEK_SET):
+        return self.body.seek(offset, whence)
+
+
+class Journal(object):
+    # append only record of the finished work of one transfer, one json
+    # object per line, so a crash loses at most the line being written
+
+    def __init__(self, *fields):
+        name      = '\0'.join(str(field) for field in fields)
+        self.path = os.path.join(os.path.expanduser(JOURNAL_DIR), 
+                                 hashlib.sha1(name.encode()).hexdigest())
+        self.lock = threading.Lock()
+
+    def load(self):
+        records = []
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:  # torn last line
+                        break
+        except IOError:
+            pass
+        return records
+
+    def append(self, record):
+        with self.lock:
+            directory = os.path.dirname(self.path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok = True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class MetaCache(object):
+    # status, etag, size and last-modified of heads by zone, bucket and key
+    # (empty for the bucket itself). sqlite does the locking, so several
+    # processes can share the file
+
+    def __init__(self, path = CACHE_DB, size = CACHE_SIZE):
+        self.path = os.path.expanduser(path)
+        self.size = size
+
+    def connect(self, create = True):
+        # returns None when there is no cache yet and create is False
+        import sqlite3
+        if not os.path.exists(self.path):
+            if not create:
+                return None
+            directory = os.path.dirname(self.path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok = True)
+        db = sqlite3.connect(self.path, timeout = 30, isolation_level = None)
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('CREATE TABLE IF NOT EXISTS heads (zone TEXT, '
+                   'bucket TEXT, key TEXT, status INTEGER, reason TEXT, '
+                   'etag TEXT, size INTEGER, modified TEXT, stored REAL, '
+                   'used REAL, PRIMARY KEY (zone, bucket, key))')
+        db.execute('CREATE INDEX IF NOT EXISTS heads_used ON heads (used)')
+        return db
+
+    def get(self, zone, bucket, key, ttl):
+        # returns the entry as a dict, None when missing or expired
+        import sqlite3
+        now = time.time()
+        try:
+            db = self.connect(create = False)
+            if db is None:
+                return None
+            try:
+                row = db.execute('SELECT status, reason, etag, size, '
+                                 'modified FROM heads WHERE zone = ? AND '
+                                 'bucket = ? AND key = ? AND stored > ?', 
+                                 (zone, bucket, key, now - ttl)).fetchone()
+                if row is None:
+                    return None
+                db.execute('UPDATE heads SET used = ? WHERE zone = ? AND '
+                           'bucket = ? AND key = ?', (now, zone, bucket, key))
+            finally:
+                db.close()
+        except sqlite3.Error:
+            return None
+        return dict(zip(('status', 'reason', 'etag', 'size', 'modified'), 
+                        row))
+
+    def put(self, zone, bucket, key, status, reason, headers):
+        import sqlite3
+        now  = time.time()
+        size = headers.get('Content-Length')
+        try:
+            db = self.connect()
+            try:
+                db.execute('INSERT OR REPLACE INTO heads VALUES '
+                           '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', 
+                           (zone, bucket, key, status, reason, 
+                            headers.get('ETag'), 
+                            int(size) if size is not None else None, 
+                            headers.get('Last-Modified'), now, now))
+                db.execute('DELETE FROM heads WHERE rowid IN (SELECT rowid '
+                           'FROM heads ORDER BY used DESC LIMIT -1 '
+                           'OFFSET ?)', (self.size, ))
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            sys.stderr.write('[WARN] metadata cache: %s\n' % e)
+
+    def invalidate(self, zone, bucket, keys = None):
+        # drops the given keys, or everything of the bucket, the cache
+        # file is not created just to be invalidated
+        import sqlite3
+        try:
+            db = self.connect(create = False)
+            if db is None:
+                return
+            try:
+                if keys is None:
+                    db.execute('DELETE FROM heads WHERE zone = ? AND '
+                               'bucket = ?', (zone, bucket))
+                else:
+                    db.executemany('DELETE FROM heads WHERE zone = ? AND '
+                                   'bucket = ? AND key = ?', 
+                                   [(zone, bucket, key) for key in keys])
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            sys.stderr.write('[WARN] metadata cache: %s\n' % e)
+
+
+class HashCache(object):
+    # etags of local files, an entry is only used while the size and the
+    # mtime of the file stay the same
+
+    def __init__(self, path = HASH_DB):
+        self.path = os.path.expanduser(path)
+
+    def connect(self):
+        import sqlite3
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok = True)
+        db = sqlite3.connect(self.path, timeout = 30, isolation_level = None)
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('CREATE TABLE IF NOT EXISTS hashes (path TEXT, '
+                   'part_size INTEGER, size INTEGER, mtime INTEGER, '
+                   'etag TEXT, PRIMARY KEY (path, part_size))')
+        return db
+
+    def get(self, path, size, mtime, part_size):
+        import sqlite3
+        try:
+            db = self.connect()
+            try:
+                row = db.execute('SELECT etag FROM hashes WHERE path = ? AND '
+                                 'part_size = ? AND size = ? AND mtime = ?', 
+                                 (os.path.realpath(path), part_size, size, 
+                                  mtime)).fetchone()
+            finally:
+                db.close()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else None
+
+    def put(self, path, size, mtime, part_size, etag):
+        import sqlite3
+        try:
+            db = self.connect()
+            try:
+                db.execute('INSERT OR REPLACE INTO hashes VALUES '
+                           '(?, ?, ?, ?, ?)', (os.path.realpath(path), 
+                                    part_size, size, mtime, etag))
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            sys.stderr.write('[WARN] hash cache: %s\n' % e)
+
 
 class BaseAction(object):
     command     = ''
@@ -35,32 +1426,88 @@ class BaseAction(object):
     description = ''
 
     conn        = None
+    pool_size   = 10
+    configs     = {}
+
+    # retry settings and counters shared by every request of the process
+    retries     = RETRIES
+    deadline    = None
+    retry_stats = {'retries' : 0, 'delay' : 0.0}
+    retry_lock  = threading.Lock()
+
+    # byte and request limits shared by every request of the process
+    throttle    = Throttle()
+    tracer      = Tracer()
 
     @classmethod
     def add_common_arguments(self, parser, args):
-        # FIX: get default config file path
-        config = Config()
-        default_conf_path = config.get_user_config_file_path()
         parser.add_argument(
             '-f', 
             '--config', 
             dest    = 'conf_file', 
-            default = default_conf_path, 
+            default = os.path.expanduser(CONFIG), 
             help    = 'Config file location'
         )
-
-        # get zone info. from config file
-        options = parser.parse_known_args(args)
-        # index 0 is known arg for -f or --config option
-        options = options[0]
-
-        conf    = self.get_config(options.conf_file)
+        # the default zone comes from the config file, which is only
+        # loaded once the arguments are parsed
         parser.add_argument(
             '-z', 
             '--zone', 
             dest    = 'zone', 
-            default = conf.zone, 
-            help    = 'On which zone', 
+            help    = 'On which zone, default to the zone of the config file', 
+        )
+        parser.add_argument(
+            '--retries', 
+            dest    = 'retries', 
+            type    = int, 
+            default = RETRIES, 
+            help    = 'How many times to retry a request failing with a '
+                      'connection error, 429 or 5xx', 
+        )
+        parser.add_argument(
+            '--timeout', 
+            dest    = 'timeout', 
+            type    = float, 
+            help    = 'Seconds to wait for a connection or a response', 
+        )
+        parser.add_argument(
+            '--deadline', 
+            dest    = 'deadline', 
+            type    = float, 
+            help    = 'Seconds after which a request is not retried again', 
+        )
+        parser.add_argument(
+            '--limit-rate', 
+            dest    = 'limit_rate', 
+            type    = parse_size, 
+            help    = 'Bytes per second to send and receive at most, '
+                      'e.g. 512K, 10M', 
+        )
+        parser.add_argument(
+            '--limit-requests', 
+            dest    = 'limit_requests', 
+            type    = float, 
+            help    = 'Requests per second to send at most', 
+        )
+        parser.add_argument(
+            '--trace', 
+            dest    = 'trace', 
+            help    = 'Append the timings of every request to this file, '
+                      'one json object per line', 
+        )
+        parser.add_argument(
+            '--metrics', 
+            dest    = 'metrics', 
+            help    = 'Add the request latency histograms to this file in '
+                      'prometheus text format, e.g. for the textfile '
+                      'collector', 
+        )
+        parser.add_argument(
+            '--limit-file', 
+            dest    = 'limit_file', 
+            help    = 'Json file with "rate" and "requests" limits, '
+                      'reloaded when it changes and shared by the '
+                      'processes using it', 
         )
 
     @classmethod
@@ -80,12 +1527,17 @@ class BaseAction(object):
 
     @classmethod
     def get_config(self, path):
+        # every config file is loaded once per process
+        if path in BaseAction.configs:
+            return BaseAction.configs[path]
+        from qingstor.sdk.config import Config
         config = Config()
         try:
             config.load_config_from_filepath(path)
         except:
             print('[ERROR] failed to load config info from %s' % path)
             sys.exit(-1)
+        BaseAction.configs[path] = config
         return config
 
     @classmethod
@@ -108,30 +1560,224 @@ class BaseAction(object):
             print('[ERROR] cannot find zone info in config file')
             sys.exit(-1)
 
+        from qingstor.sdk.config            import Config
+        from qingstor.sdk.service.qingstor  import QingStor
         config      = Config(key_id, secret_key)
+        # the endpoint of the config file, the sdk defaults otherwise
+        config.host     = conf.host
+        config.port     = conf.port
+        config.protocol = conf.protocol
         service     = QingStor(config)
         return service
 
+    @classmethod
+    def setup_connection(self, options):
+        # retries are done by call(), not by the adapters of the sdk
+        from requests.adapters import HTTPAdapter
+        client = self.conn.client
+        for prefix in list(client.adapters):
+            client.mount(prefix, HTTPAdapter(
+                pool_connections = BaseAction.pool_size, 
+                pool_maxsize     = BaseAction.pool_size, 
+                max_retries      = 0, 
+            ))
+        self.apply_options(options)
+
+    @classmethod
+    def apply_options(self, options):
+        # the request options of one command, serve applies them again to
+        # its shared connections for every command
+        client = self.conn.client
+        vars(client).pop('send', None)  # the timeout of the last command
+        if options.timeout:
+            client.send = partial(client.send, timeout = options.timeout)
+        BaseAction.retries  = max(0, options.retries)
+        BaseAction.deadline = options.deadline
+        BaseAction.throttle.configure(options.limit_rate, 
+                                      options.limit_requests, 
+                                      options.limit_file)
+        BaseAction.tracer.configure(options.trace, options.metrics)
+
+    @classmethod
+    def call(self, method, *args, **kwargs):
+        # runs one sdk call, retrying connection errors, 429 and 5xx with
+        # backoff until the retries or the deadline run out. calls that
+        # are not idempotent are only retried when the server refused
+        # them with 429 or 503, bodies are rewound before every retry
+        from requests.exceptions import ConnectionError, Timeout
+        idempotent = kwargs.pop('idempotent', True)
+        throttle   = BaseAction.throttle
+        tracer     = BaseAction.tracer
+        body       = kwargs.get('body')
+        if body is not None and throttle.active:
+            body = kwargs['body'] = ThrottledReader(body, throttle)
+        sent       = tracer.body_size(body) if tracer.active else 0
+        position   = None
+        if hasattr(body, 'seek'):
+            position = body.tell()
+        retryable  = position is not None or body is None \
+                        or isinstance(body, (bytes, bytearray, str))
+
+        start   = time.time()
+        attempt = 0
+        while True:
+            resp, error = None, None
+            if throttle.active:
+                throttle.take_request()
+            if tracer.active:
+                tracer.begin()
+            try:
+                resp = method(*args, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                error = e
+            if tracer.active:
+                tracer.record(method, resp, error, attempt, sent)
+            if resp is not None:
+                code = resp.status_code
+                if code < 500 and code != HTTP_TOO_MANY_REQUESTS:
+                    return resp
+                if not idempotent and code not in (HTTP_TOO_MANY_REQUESTS, 
+                                                   HTTP_SERVICE_UNAVAILABLE):
+                    return resp
+            elif not idempotent:
+                raise error
+
+            attempt += 1
+            delay    = backoff_delay(attempt)
+            if not retryable or attempt > BaseAction.retries or (
+                    BaseAction.deadline is not None and 
+                    time.time() + delay - start > BaseAction.deadline):
+                if error is not None:
+                    raise error
+                return resp
+
+            with BaseAction.retry_lock:
+                BaseAction.retry_stats['retries'] += 1
+                BaseAction.retry_stats['delay']   += delay
+            time.sleep(delay)
+            if position is not None:
+                body.seek(position)
+
+    @classmethod
+    def invalidate(self, bucket, keys = None):
+        # called after every write, so heads cached by any process are
+        # not served stale
+        MetaCache().invalidate(bucket.properties['zone'], 
+                               bucket.properties['bucket-name'], keys)
+
+    @classmethod
+    def add_cache_argument(self, parser):
+        parser.add_argument(
+            '--cache', 
+            dest    = 'cache', 
+            type    = int, 
+            nargs   = '?', 
+            const   = CACHE_TTL, 
+            metavar = 'TTL', 
+            help    = 'Answer from the local metadata cache when it was '
+                      'filled less than TTL (default %d) seconds ago' 
+                                                            % CACHE_TTL, 
+        )
+
+    @classmethod
+    def send_cached_head(self, options, key, head):
+        # head-object and head-bucket, only 200 and 404 answers are cached
+        cache = MetaCache()
+        if options.cache:
+            entry = cache.get(options.zone, options.bucket, key, 
+                              options.cache)
+            if entry is not None:
+                headers = {
+                    'ETag'           : entry['etag'], 
+                    'Content-Length' : entry['size'] is not None and \
+                                            str(entry['size']) or None, 
+                    'Last-Modified'  : entry['modified'], 
+                }
+                return entry['status'], entry['reason'], dict(
+                        (k, v) for k, v in headers.items() if v is not None)
+        resp = head()
+        if options.cache is not None and \
+                resp.status_code in (HTTP_OK, HTTP_NOT_FOUND):
+            cache.put(options.zone, options.bucket, key, resp.status_code, 
+                      resp.res.reason, resp.headers)
+        return resp.status_code, resp.res.reason, resp.headers
+
+    @classmethod
+    def iter_content(self, resp, size):
+        # the chunks of a streamed response body, within the byte limit
+        throttle = BaseAction.throttle
+        start    = time.time()
+        if not throttle.active:
+            for chunk in resp.iter_content(size):
+                yield chunk
+        else:
+            for chunk in resp.iter_content(min(size, THROTTLE_CHUNK)):
+                throttle.take_bytes(len(chunk))
+                yield chunk
+        if BaseAction.tracer.active:
+            BaseAction.tracer.record_body(resp, time.time() - start)
+
+    @classmethod
+    def report_retries(self):
+        stats = BaseAction.retry_stats
+        if stats['retries']:
+            sys.stderr.write('[INFO] %d retries, %.3fs added by backoff\n' 
+                                        % (stats['retries'], stats['delay']))
+
+    @classmethod
+    def grow_connection_pool(self, size):
+        # the sdk mounts adapters with the default pool size (10), keep one
+        # connection per worker so they are not discarded after each request
+        if size <= BaseAction.pool_size:
+            return
+        from requests.adapters import HTTPAdapter
+        BaseAction.pool_size = size
+        client = self.conn.client
+        for prefix, adapter in list(client.adapters.items()):
+            client.mount(prefix, HTTPAdapter(
+                pool_connections = size, 
+                pool_maxsize     = size, 
+                max_retries      = adapter.max_retries, 
+            ))
+
     @classmethod
     def send_request(self, options):
         return None
 
     @classmethod
-    def main(self, args):
+    def get_options(self, args):
         # parse config file path
         parser      = self.get_argument_parser(args)
 
         # parse arguments
         options     = parser.parse_args(args)
 
-        # load config from config file
+        # load config from config file, once for the whole process
         conf   = self.get_config(options.conf_file)
         if conf is None: sys.exit(-1)
+        if options.zone is None:
+            options.zone = getattr(conf, 'zone', None)
+        return options, conf
 
-        # get a connection from server
-        self.conn   = self.get_connection(conf)
+    @classmethod
+    def main(self, args):
+        options, conf = self.get_options(args)
+
+        # get a connection from server, shared by all actions
+        BaseAction.conn = self.get_connection(conf)
+        self.setup_connection(options)
 
-        return self.send_request(options)
+        from requests.exceptions import ConnectionError, Timeout
+
+        try:
+            return self.send_request(options)
+        except (ConnectionError, Timeout) as e:
+            print('[ERROR] %s' % e)
+            sys.exit(-1)
+        finally:
+            self.report_retries()
+            BaseAction.throttle.report()
+            BaseAction.tracer.flush()
 
 class NoAction(BaseAction):
     pass
@@ -146,7 +1792,7 @@ class ListBucketsAction(BaseAction):
 
     @classmethod
     def send_request(self, options):
-        resp = self.conn.list_buckets(options.zone)
+        resp = self.call(self.conn.list_buckets, options.zone)
         print(resp.status_code, options.zone, resp.content.decode())
 
 class CreateBucketAction(BaseAction):
@@ -167,7 +1813,8 @@ class CreateBucketAction(BaseAction):
     @classmethod
     def send_request(self, options):
         bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp = bucket.put()
+        resp = self.call(bucket.put)
+        self.invalidate(bucket)
         if resp.status_code == HTTP_OK_CREATED:
             print("Bucket %s at %s created successfully" 
                         % (options.bucket, options.zone))
@@ -176,7 +1823,8 @@ class CreateBucketAction(BaseAction):
 
 class DeleteBucketAction(BaseAction):
     command = 'delete-bucket'
-    usage   = '%(prog)s -b <bucket> [-z <zone> -f <conf_file>]'
+    usage   = '%(prog)s -b <bucket> [--empty -j <jobs> -z <zone> ' \
+                                                    '-f <conf_file>]'
 
     @classmethod
     def add_ext_arguments(self, parser):
@@ -187,12 +1835,38 @@ class DeleteBucketAction(BaseAction):
             required    = True, 
             help        = 'The bucket name', 
         )
+        parser.add_argument(
+            '--empty', 
+            dest        = 'empty', 
+            action      = 'store_true', 
+            help        = 'Delete all objects of the bucket first', 
+        )
+        parser.add_argument(
+            '-j', 
+            '--jobs', 
+            dest        = 'jobs', 
+            type        = int, 
+            default     = MAX_WORKERS, 
+            help        = 'How many delete requests to send at the same time', 
+        )
         return parser
 
     @classmethod
     def send_request(self, options):
         bucket  = self.conn.Bucket(options.bucket, options.zone)
-        resp    = bucket.delete()
+        if options.empty:
+            try:
+                deleted, failed = DeleteObjectsAction.delete_keys(bucket, 
+                        (key['key'] for key in list_all_objects(bucket)), 
+                        options.jobs, options.retries)
+            except IOError as e:
+                print('[ERROR] %s' % e)
+                sys.exit(-1)
+            print('%d deleted, %d failed' % (deleted, failed))
+            if failed:
+                sys.exit(-1)
+        resp    = self.call(bucket.delete)
+        self.invalidate(bucket)
         if resp.status_code != HTTP_OK_NO_CONTENT:
             print(resp.status_code, resp.content.decode())
         else:
@@ -201,7 +1875,8 @@ class DeleteBucketAction(BaseAction):
 
 class HeadBucketAction(BaseAction):
     command = 'head-bucket'
-    usage   = '%(prog)s -b <bucket> [-z <zone> -f <conf_file>]'
+    usage   = '%(prog)s -b <bucket> [--cache [<ttl>] -z <zone> ' \
+                                                    '-f <conf_file>]'
 
     @classmethod
     def add_ext_arguments(self, parser):
@@ -212,13 +1887,15 @@ class HeadBucketAction(BaseAction):
             required = True, 
             help     = 'The bucket name', 
         )
+        self.add_cache_argument(parser)
         return parser
 
     @classmethod
     def send_request(self, options):
         bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.head()
-        print(resp.status_code, resp.res.reason)
+        status, reason, headers = self.send_cached_head(options, '', 
+                                            partial(self.call, bucket.head))
+        print(status, reason)
 
 class StatsBucketAction(BaseAction):
     command = 'stats-bucket'
@@ -238,13 +1915,14 @@ class StatsBucketAction(BaseAction):
     @classmethod
     def send_request(self, options):
         bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.get_statistics()
+        resp   = self.call(bucket.get_statistics)
         print(resp.status_code, resp.res.reason, resp.content.decode())
 
 class ListObjectsAction(BaseAction):
     command = 'list-objects'
     usage   = '%(prog)s -b <bucket> [-z <zone> -p <prefix> ' \
-              '-d <delimiter> -m <marker> -l <limit> -f <conf_file>]'
+              '-d <delimiter> -m <marker> -l <limit> -a --prefetch ' \
+              '--shard -S <key> [<key> ...] -j <jobs> -f <conf_file>]'
 
     @classmethod
     def add_ext_arguments(self, parser):
@@ -280,18 +1958,327 @@ class ListObjectsAction(BaseAction):
             type    = int, 
             help    = 'The maximum number of keys returned', 
         )
+        parser.add_argument(
+            '-a', 
+            '--all', 
+            dest    = 'all', 
+            action  = 'store_true', 
+            help    = 'Follow the markers through all pages and print one '
+                      'json object per line, -l sets the page size', 
+        )
+        parser.add_argument(
+            '--prefetch', 
+            dest    = 'prefetch', 
+            action  = 'store_true', 
+            help    = 'Fetch the next page while printing the current one', 
+        )
+        parser.add_argument(
+            '--shard', 
+            dest    = 'shard', 
+            action  = 'store_true', 
+            help    = 'Like --all, but list key ranges at the same time, '
+                      'split at the common prefixes of -d (default /)', 
+        )
+        parser.add_argument(
+            '-S', 
+            '--split-at', 
+            dest    = 'split_at', 
+            nargs   = '*', 
+            help    = 'Like --shard, but split the key ranges after '
+                      'these keys', 
+        )
+        parser.add_argument(
+            '-j', 
+            '--jobs', 
+            dest    = 'jobs', 
+            type    = int, 
+            default = MAX_WORKERS, 
+            help    = 'How many key ranges to list at the same time', 
+        )
+        return parser
+
+    @classmethod
+    def get_boundaries(self, bucket, options):
+        if options.split_at:
+            return sorted(set(options.split_at))
+
+        # one shard per common prefix, merged down to a few per worker
+        prefixes = []
+        for page in list_object_pages(bucket, options.prefix, 
+                                      options.delimiter or '/', 
+                                      options.marker, options.limit):
+            prefixes.extend(page.get('common_prefixes') or [])
+        step = max(1, len(prefixes) // (max(1, options.jobs) * 4))
+        return prefixes[::step]
+
+    @classmethod
+    def list_shard(self, bucket, options, start, end):
+        # spools the keys after start up to and including end to a file
+        spool = tempfile.TemporaryFile(mode = 'w+')
+        for key in list_all_objects(bucket, options.prefix, None, start, 
+                                    options.limit):
+            if end is not None and key['key'] > end:
+                break
+            spool.write(json.dumps(key) + '\n')
+        spool.seek(0)
+        return spool
+
+    @classmethod
+    def send_sharded(self, options):
+        bucket = self.conn.Bucket(options.bucket, options.zone)
+        try:
+            bounds = self.get_boundaries(bucket, options)
+        except IOError as e:
+            print('[ERROR] %s' % e)
+            sys.exit(-1)
+        if options.marker:
+            bounds = [b for b in bounds if b > options.marker]
+
+        # shards are disjoint and ordered, so printing them one after
+        # another keeps the keys in order
+        starts = [options.marker] + bounds
+        ends   = bounds + [None]
+        jobs   = max(1, options.jobs)
+        self.grow_connection_pool(jobs)
+        with worker_pool(jobs) as pool:
+            futures = [pool.submit(self.list_shard, bucket, options, 
+                                   start, end) 
+                            for start, end in zip(starts, ends)]
+            try:
+                for future in futures:
+                    with future.result() as spool:
+                        shutil.copyfileobj(spool, sys.stdout)
+                sys.stdout.flush()
+            except BrokenPipeError:
+                for f in futures: f.cancel()
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                sys.exit(-1)
+            except IOError as e:
+                for f in futures: f.cancel()
+                print('[ERROR] %s' % e)
+                sys.exit(-1)
+
+    @classmethod
+    def send_all(self, options):
+        bucket = self.conn.Bucket(options.bucket, options.zone)
+        pages  = list_object_pages(bucket, options.prefix, options.delimiter, 
+                                   options.marker, options.limit)
+        if options.prefetch:
+            pages = prefetch(pages)
+
+        write = sys.stdout.write
+        try:
+            for page in pages:
+                for prefix in page.get('common_prefixes') or []:
+                    write(json.dumps({'common_prefix' : prefix}) + '\n')
+                for key in page.get('keys') or []:
+                    write(json.dumps(key) + '\n')
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # the reader went away, e.g. piped to head
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(-1)
+        except IOError as e:
+            print('[ERROR] %s' % e)
+            sys.exit(-1)
+
+    @classmethod
+    def send_request(self, options):
+        if options.shard or options.split_at:
+            return self.send_sharded(options)
+        if options.all:
+            return self.send_all(options)
+
+        bucket = self.conn.Bucket(options.bucket, options.zone)
+        resp   = self.call(bucket.list_objects, 
+                    options.delimiter, 
+                    options.limit, 
+                    options.marker, 
+                    options.prefix
+                )
+        print(resp.status_code, resp.res.reason, resp.content.decode())
+
+class IndexAction(BaseAction):
+    command = 'index'
+    usage   = '%(prog)s -b <bucket> [--refresh --rebuild -j <jobs> ' \
+              '-p <prefix> --older-than <age> -l -z <zone> -f <conf_file>]'
+
+    @classmethod
+    def add_ext_arguments(self, parser):
+        parser.add_argument(
+            '-b', 
+            '--bucket', 
+            dest     = 'bucket', 
+            required = True, 
+            help     = 'The bucket name', 
+        )
+        parser.add_argument(
+            '--refresh', 
+            dest    = 'refresh', 
+            action  = 'store_true', 
+            help    = 'Add the keys listed after the last indexed key '
+                      'before answering', 
+        )
+        parser.add_argument(
+            '--rebuild', 
+            dest    = 'rebuild', 
+            action  = 'store_true', 
+            help    = 'List the whole bucket again, e.g. to drop deleted '
+                      'keys, before answering', 
+        )
+        parser.add_argument(
+            '-j', 
+            '--jobs', 
+            dest    = 'jobs', 
+            type    = int, 
+            default = MAX_WORKERS, 
+            help    = 'How many key ranges to list at the same time '
+                      'with --rebuild', 
+        )
+        parser.add_argument(
+            '-p', 
+            '--prefix', 
+            dest    = 'prefix', 
+            default = '', 
+            help    = 'Only count the keys starting with this prefix', 
+        )
+        parser.add_argument(
+            '--older-than', 
+            dest    = 'older_than', 
+            type    = parse_age, 
+            help    = 'Only count the keys modified longer ago than this, '
+                      'e.g. 3600, 12h, 30d', 
+        )
+        parser.add_argument(
+            '-l', 
+            '--list', 
+            dest    = 'list', 
+            action  = 'store_true', 
+            help    = 'Print the matching keys, one json object per line', 
+        )
         return parser
 
+    @classmethod
+    def connect(self, options, rebuild = False):
+        import sqlite3
+        directory = os.path.expanduser(INDEX_DIR)
+        path      = os.path.join(directory, '%s.%s.db' 
+                                        % (options.zone, options.bucket))
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok = True)
+        if rebuild:
+            # built aside, so queries keep the old index until it is done
+            path += '.new'
+            if os.path.exists(path):
+                os.remove(path)
+        elif not os.path.exists(path) and not options.refresh:
+            return None, path
+        db = sqlite3.connect(path)
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('PRAGMA synchronous = NORMAL')
+        db.execute('CREATE TABLE IF NOT EXISTS objects (key TEXT PRIMARY '
+                   'KEY, size INTEGER, modified INTEGER, etag TEXT) '
+                   'WITHOUT ROWID')
+        db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, '
+                   'value TEXT)')
+        db.commit()
+        return db, path
+
+    @classmethod
+    def add_keys(self, db, keys):
+        # one transaction per page, the marker moves with the keys so an
+        # interrupted refresh goes on from there
+        keys = list(keys)
+        if not keys:
+            return
+        db.executemany('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)', 
+                       [(key['key'], key.get('size'), key.get('modified'), 
+                         key.get('etag')) for key in keys])
+        db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', 
+                   ('marker', keys[-1]['key']))
+        db.commit()
+
+    @classmethod
+    def refresh(self, bucket, db):
+        row    = db.execute("SELECT value FROM meta WHERE name = 'marker'") \
+                   .fetchone()
+        for page in prefetch(list_object_pages(bucket, 
+                                    marker = row[0] if row else None)):
+            self.add_keys(db, page.get('keys') or [])
+
+    @classmethod
+    def rebuild(self, bucket, db, options):
+        # the key ranges of list-objects --shard, added in order
+        shards = Namespace(prefix = None, delimiter = None, marker = None, 
+                           limit = None, split_at = None, jobs = options.jobs)
+        bounds = ListObjectsAction.get_boundaries(bucket, shards)
+        jobs   = max(1, options.jobs)
+        self.grow_connection_pool(jobs)
+        with worker_pool(jobs) as pool:
+            futures = [pool.submit(ListObjectsAction.list_shard, bucket, 
+                                   shards, start, end) 
+                            for start, end in zip([None] + bounds, 
+                                                  bounds + [None])]
+            try:
+                for future in futures:
+                    with future.result() as spool:
+                        batch = []
+                        for line in spool:
+                            batch.append(json.loads(line))
+                            if len(batch) == INDEX_BATCH:
+                                self.add_keys(db, batch)
+                                batch = []
+                        self.add_keys(db, batch)
+            except BaseException:
+                for f in futures: f.cancel()
+                raise
+
     @classmethod
     def send_request(self, options):
         bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.list_objects(
-                    options.delimiter, 
-                    options.limit, 
-                    options.marker, 
-                    options.prefix
-                )
-        print(resp.status_code, resp.res.reason, resp.content.decode())
+        try:
+            if options.rebuild:
+                db, path = self.connect(options, rebuild = True)
+                self.rebuild(bucket, db, options)
+                db.close()
+                os.replace(path, path[:-len('.new')])
+            db, path = self.connect(options)
+            if db is None:
+                print('[ERROR] No index of %s yet, run with --refresh' 
+                                                        % options.bucket)
+                sys.exit(-1)
+            if options.refresh and not options.rebuild:
+                self.refresh(bucket, db)
+        except IOError as e:
+            print('[ERROR] %s' % e)
+            sys.exit(-1)
+
+        # keys of a prefix are a range of the primary key
+        where  = 'key >= ? AND key < ?'
+        params = [options.prefix, options.prefix + '\U0010ffff']
+        if options.older_than is not None:
+            where += ' AND modified < ?'
+            params.append(int(time.time()) - options.older_than)
+
+        if options.list:
+            write = sys.stdout.write
+            try:
+                for key, size, modified, etag in db.execute(
+                        'SELECT key, size, modified, etag FROM objects '
+                        'WHERE ' + where + ' ORDER BY key', params):
+                    write(json.dumps({'key' : key, 'size' : size, 
+                                      'modified' : modified, 
+                                      'etag' : etag}) + '\n')
+                sys.stdout.flush()
+            except BrokenPipeError:
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                sys.exit(-1)
+            return
+
+        count, size = db.execute('SELECT count(*), coalesce(sum(size), 0) '
+                                 'FROM objects WHERE ' + where, 
+                                 params).fetchone()
+        print('%d objects, %d bytes' % (count, size))
 
 class GetBucketAclAction(BaseAction):
     command = 'get-bucket-acl'
@@ -311,7 +2298,7 @@ class GetBucketAclAction(BaseAction):
     @classmethod
     def send_request(self, options):
         bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.get_acl()
+        resp   = self.call(bucket.get_acl)
         print(resp.status_code, resp.res.reason, resp.content.decode())
 
 class SetBucketAclAction(BaseAction):
@@ -370,13 +2357,16 @@ class SetBucketAclAction(BaseAction):
             })
 
         bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.put_acl(acl)
+        resp   = self.call(bucket.put_acl, acl)
         print(resp.status_code, resp.res.reason, resp.content.decode())
 
 class CreateObjectAction(BaseAction):
     command = 'create-object'
     usage   = '%(prog)s -b <bucket> -k <key> -F <file> -d <data> ' \
-                            '[-t <type> -z <zone> -f <conf_file>]'
+                '[-t <type> -j <jobs> --part-size <size> ' \
+                '--multipart-threshold <size> --skip-existing ' \
+                '--compress <codec> --progress --progress-fd <fd> ' \
+                '-z <zone> -f <conf_file>]'
 
     @classmethod
     def add_ext_arguments(self, parser):
@@ -398,7 +2388,8 @@ class CreateObjectAction(BaseAction):
             '-F', 
             '--file', 
             dest = 'file', 
-            help = 'The object file', 
+            help = 'The object file, - to read the object from stdin, '
+                   'uploaded in parts while it is read', 
         )
         parser.add_argument(
             '-d', 
@@ -413,34 +2404,378 @@ class CreateObjectAction(BaseAction):
             default = 'application/octet-stream', 
             help    = 'The object type', 
         )
+        add_multipart_arguments(parser)
+        parser.add_argument(
+            '-u', 
+            '--upload-id', 
+            dest = 'upload_id', 
+            help = 'Resume this multipart upload, skipping the parts '
+                   'the server already has', 
+        )
+        parser.add_argument(
+            '--skip-existing', 
+            dest    = 'skip_existing', 
+            action  = 'store_true', 
+            help    = 'Do not upload when the object has the same size and '
+                      'etag (multipart etags included) as the content', 
+        )
+        parser.add_argument(
+            '--compress', 
+            dest    = 'compress', 
+            choices = sorted(CODECS), 
+            help    = 'Compress the object on -j threads while uploading '
+                      'it, get-object decodes it again', 
+        )
+        add_progress_arguments(parser)
         return parser
 
+    @classmethod
+    def send_compressed(self, bucket, options):
+        if options.skip_existing:
+            print('[ERROR] --skip-existing cannot be used with --compress')
+            sys.exit(-1)
+        if options.file == '-':
+            source = sys.stdin.buffer
+        elif options.file:
+            if not os.path.isfile(options.file):
+                print('[ERROR] No such file %s' % options.file)
+                sys.exit(-1)
+            source = open(options.file, 'rb')
+        elif options.data:
+            source = io.BytesIO(options.data.encode())
+        else:
+            print('[ERROR] must specify -F, --file, -d or --data argument')
+            sys.exit(-1)
+
+        compress = load_codec(options.compress)[0]
+        progress = get_progress(options, options.key)
+        reader   = CompressedReader(source, compress, options.jobs)
+        try:
+            resp = self.upload_stream(bucket, options, options.key, reader, 
+                                      progress, {CODEC_META : options.compress})
+        except IOError as e:
+            if progress:
+                progress.finish(ok = False)
+            print('[ERROR] %s' % e)
+            sys.exit(-1)
+        finally:
+            reader.close()
+            source.close()
+            self.invalidate(bucket, [options.key])
+        if progress:
+            progress.finish(ok = resp.status_code == HTTP_OK_CREATED)
+        print(resp.status_code, resp.res.reason, resp.content.decode())
+
+    @classmethod
+    def is_unchanged(self, bucket, options, key, path = None, data = None):
+        # compares the size and the etag of the object with a file or data
+        resp = self.call(bucket.head_object, key)
+        if resp.status_code != HTTP_OK:
+            return False
+        etag = resp.headers.get('ETag')
+        size = resp.headers.get('Content-Length')
+        if data is not None:
+            data = data.encode()
+            return size == str(len(data)) and same_etag(etag, 
+                            '"%s"' % hashlib.md5(data).hexdigest())
+        return size == str(os.path.getsize(path)) and \
+                same_etag(etag, local_etag(path, etag, options.part_size))
+
+    @classmethod
+    def upload_part(self, bucket, key, upload_id, path, part, 
+                    progress = None):
+        part_number, offset, length = part
+        start = time.time()
+        with FileSlice(path, offset, length) as data:
+            resp = self.call(bucket.upload_multipart, 
+                        key, 
+                        part_number = str(part_number), 
+                        upload_id   = upload_id, 
+                        body        = data, 
+                    )
+        if progress and resp.status_code == HTTP_OK_CREATED:
+            progress.update(length)
+            progress.part(part_number, length, time.time() - start)
+        return resp
+
+    @classmethod
+    def resume_multipart(self, bucket, key, path, journal, options, parts):
+        # returns upload id and finished part numbers of a previous run,
+        # from the local journal or, given -u, from the server
+        records   = journal.load()
+        upload_id = options.upload_id
+        if not upload_id and records:
+            upload_id = records[0].get('upload_id')
+        elif records and records[0].get('upload_id') != upload_id:
+            records = []
+        if not upload_id:
+            return None, set()
+
+        uploaded = list_uploaded_parts(bucket, key, upload_id)
+        if uploaded is None:
+            if options.upload_id:
+                raise IOError('no such multipart upload %s' % upload_id)
+            journal.remove()
+            return None, set()
+
+        if records:
+            done = set(r['part_number'] for r in records[1:])
+        else:
+            # no journal, trust the server side parts matching the file
+            journal.remove()
+            journal.append({'upload_id' : upload_id})
+            done = set()
+            for n, offset, length in parts:
+                if n in uploaded and uploaded[n] == (length, 
+                        part_etag(path, offset, length)):
+                    journal.append({'part_number' : n, 
+                                    'etag'        : uploaded[n][1]})
+                    done.add(n)
+        return upload_id, done & set(uploaded)
+
+    @classmethod
+    def upload_multipart(self, bucket, options, key, path, progress = None):
+        # raises IOError when the upload cannot be finished
+        parts   = get_part_ranges(os.path.getsize(path), options.part_size)
+        journal = Journal(options.zone, options.bucket, key, 
+                          file_fingerprint(path), options.part_size)
+        upload_id, done = self.resume_multipart(bucket, key, path, journal, 
+                                                options, parts)
+        if upload_id is None:
+            resp = self.call(bucket.initiate_multipart_upload, 
+                        key, 
+                        content_type = options.type, 
+                        idempotent   = False, 
+                    )
+            if resp.status_code != HTTP_OK:
+                raise IOError('%s %s %s' % (resp.status_code, 
+                                resp.res.reason, resp.content.decode()))
+            upload_id = resp['upload_id']
+            journal.append({'upload_id' : upload_id})
+
+        jobs  = max(1, options.jobs)
+        self.grow_connection_pool(jobs)
+        if progress:
+            progress.update(sum(part[2] for part in parts 
+                                                if part[0] in done))
+
+        # each worker sends its part straight from the file
+        error = None
+        with worker_pool(jobs) as pool:
+            futures = {
+                pool.submit(self.upload_part, bucket, key, upload_id, 
+                            path, part, progress) : part[0]
+                for part in parts if part[0] not in done
+            }
+            for future in as_completed(futures):
+                try:
+                    resp = future.result()
+                except Exception as e:
+                    error = 'part %d: %s' % (futures[future], e)
+                else:
+                    if resp.status_code == HTTP_OK_CREATED:
+                        journal.append({
+                            'part_number' : futures[future], 
+                            'etag'        : resp.headers.get('ETag'), 
+                        })
+                        continue
+                    error = 'part %d: %s %s' % (futures[future], 
+                                        resp.status_code, resp.res.reason)
+                for f in futures: f.cancel()
+                break
+
+        if error:
+            raise IOError('multipart upload of %s failed, %s, rerun the '
+                          'same command to resume upload %s' 
+                                            % (path, error, upload_id))
+
+        resp = self.call(bucket.complete_multipart_upload, 
+                    key, 
+                    upload_id    = upload_id, 
+                    object_parts = [{'part_number' : part[0]} 
+                                                    for part in parts], 
+                    idempotent   = False, 
+                )
+        if resp.status_code == HTTP_OK_CREATED:
+            journal.remove()
+        return resp
+
+    @classmethod
+    def upload_buffer(self, bucket, key, upload_id, part_number, view, 
+                      release, progress = None):
+        start = time.time()
+        try:
+            resp = self.call(bucket.upload_multipart, 
+                        key, 
+                        part_number = str(part_number), 
+                        upload_id   = upload_id, 
+                        body        = BufferSlice(view), 
+                    )
+        finally:
+            release()
+        if resp.status_code != HTTP_OK_CREATED:
+            raise IOError('part %d: %s %s' % (part_number, resp.status_code, 
+                                              resp.res.reason))
+        if progress:
+            progress.update(len(view))
+            progress.part(part_number, len(view), time.time() - start)
+        return resp
+
+    @classmethod
+    def upload_stream(self, bucket, options, key, stream, progress = None, 
+                      meta = None):
+        # uploads a stream of unknown length, e.g. a pipe. parts are read
+        # into a ring of jobs + 1 buffers of part size and each is sent
+        # as soon as it is full, while the next one is read. a stream no
+        # longer than one part is put at once. raises IOError on failure
+        jobs      = max(1, options.jobs)
+        free      = Queue()
+        allocated = [0]
+
+        def get_buffer():
+            if free.empty() and allocated[0] <= jobs:
+                allocated[0] += 1
+                return memoryview(bytearray(options.part_size))
+            return free.get()
+
+        view = get_buffer()
+        size = read_full(stream, view)
+        if size < options.part_size:
+            resp = self.call(bucket.put_object, key, 
+                             body           = BufferSlice(view[:size]), 
+                             x_qs_meta_data = meta)
+            if progress and resp.status_code == HTTP_OK_CREATED:
+                progress.update(size)
+            return resp
+
+        resp = self.call(bucket.initiate_multipart_upload, 
+                    key, 
+                    content_type   = options.type, 
+                    x_qs_meta_data = meta, 
+                    idempotent     = False, 
+                )
+        if resp.status_code != HTTP_OK:
+            raise IOError('%s %s %s' % (resp.status_code, resp.res.reason, 
+                                        resp.content.decode()))
+        upload_id = resp['upload_id']
+        self.grow_connection_pool(jobs)
+
+        # the stream cannot be read again, a failed upload is aborted
+        futures = []
+        errors  = []
+        error   = None
+        try:
+            with worker_pool(jobs) as pool:
+                while size and not errors:
+                    if len(futures) == MAX_PARTS:
+                        raise IOError('more than %d parts, use a bigger '
+                                      '--part-size' % MAX_PARTS)
+                    future = pool.submit(self.upload_buffer, bucket, key, 
+                                upload_id, len(futures), view[:size], 
+                                partial(free.put, view), progress)
+                    future.add_done_callback(lambda f: f.exception() and 
+                                             errors.append(f.exception()))
+                    futures.append(future)
+                    # waits for a free buffer while jobs parts are in flight
+                    view = get_buffer()
+                    size = read_full(stream, view)
+                for future in futures:
+                    future.result()
+        except (IOError, ValueError) as e:
+            error = errors[0] if errors else e
+        if error:
+            self.call(bucket.abort_multipart_upload, key, upload_id)
+            raise IOError('upload of %s failed, %s' % (key, error))
+
+        return self.call(bucket.complete_multipart_upload, 
+                    key, 
+                    upload_id    = upload_id, 
+                    object_parts = [{'part_number' : n} 
+                                            for n in range(len(futures))], 
+                    idempotent   = False, 
+                )
+
+    @classmethod
+    def upload_file(self, bucket, options, key, path, progress = None):
+        try:
+            size = os.path.getsize(path)
+            if size > options.threshold:
+                return self.upload_multipart(bucket, options, key, path, 
+                                             progress)
+            with open(path, 'rb') as data:
+                resp = self.call(bucket.put_object, key, body = data)
+            if progress and resp.status_code == HTTP_OK_CREATED:
+                progress.update(size)
+            return resp
+        finally:
+            self.invalidate(bucket, [key])
+
     @classmethod
     def send_request(self, options):
-        if options.file:
+        bucket = self.conn.Bucket(options.bucket, options.zone)
+        if options.compress:
+            return self.send_compressed(bucket, options)
+        if options.file == '-':
+            key      = options.key
+            if options.skip_existing:
+                print('[ERROR] --skip-existing cannot be used with -F -')
+                sys.exit(-1)
+            progress = get_progress(options, key)
+            try:
+                resp = self.upload_stream(bucket, options, key, 
+                                          sys.stdin.buffer, progress)
+            except IOError as e:
+                if progress:
+                    progress.finish(ok = False)
+                print('[ERROR] %s' % e)
+                sys.exit(-1)
+            finally:
+                self.invalidate(bucket, [key])
+            if progress:
+                progress.finish(ok = resp.status_code == HTTP_OK_CREATED)
+        elif options.file:
             if not os.path.isfile(options.file):
                 print('[ERROR] No such file %s' % options.file)
                 sys.exit(-1)
             key  = options.key or os.path.basename(options.file)
-            data = open(options.file, 'rb')
+            if options.skip_existing and \
+                    self.is_unchanged(bucket, options, key, options.file):
+                print('%s is unchanged, not uploaded' % key)
+                return
+            progress = get_progress(options, key, 
+                                    os.path.getsize(options.file))
+            try:
+                resp = self.upload_file(bucket, options, key, options.file, 
+                                        progress)
+            except IOError as e:
+                if progress:
+                    progress.finish(ok = False)
+                print('[ERROR] %s' % e)
+                sys.exit(-1)
+            if progress:
+                progress.finish(ok = resp.status_code == HTTP_OK_CREATED)
         elif options.data:
             key  = options.key
             if not key:
                 print('[ERROR] Must specify -k or --key argument')
                 sys.exit(-1)
-            data = options.data
+            if options.skip_existing and self.is_unchanged(bucket, options, 
+                                                key, data = options.data):
+                print('%s is unchanged, not uploaded' % key)
+                return
+            resp = self.call(bucket.put_object, key, body = options.data)
+            self.invalidate(bucket, [key])
         else:
             print('[ERROR] must specify -F, --file, -d or --data argument')
             sys.exit(-1)
 
-        bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.put_object(key, body = data)
         print(resp.status_code, resp.res.reason, resp.content.decode())
 
 class GetObjectAction(BaseAction):
-    command = 'get-object', 
-    usage   = '%(prog)s -b <bucket> -k <key> ' \
-                '[-F <file> -B <bytes> -z <zone> -f <conf_file>]'
+    command = 'get-object'
+    usage   = '%(prog)s -b <bucket> -k <key> [-F <file> -B <bytes> ' \
+                '-j <jobs> --part-size <size> --buffer-size <size> --raw ' \
+                '--progress --progress-fd <fd> -z <zone> -f <conf_file>]'
 
     @classmethod
     def add_ext_arguments(self, parser):
@@ -462,7 +2797,8 @@ class GetObjectAction(BaseAction):
             '-F', 
             '--file', 
             dest = 'file', 
-            help = 'The file that the object should save to', 
+            help = 'The file that the object should save to, - to '
+                   'write it to stdout', 
         )
         parser.add_argument(
             '-B', 
@@ -470,10 +2806,242 @@ class GetObjectAction(BaseAction):
             dest = 'bytes', 
             help = 'The object data range', 
         )
+        parser.add_argument(
+            '-j', 
+            '--jobs', 
+            dest    = 'jobs', 
+            type    = int, 
+            default = 1, 
+            help    = 'How many ranges to download at the same time', 
+        )
+        parser.add_argument(
+            '--part-size', 
+            dest    = 'part_size', 
+            type    = parse_size, 
+            default = PART_SIZE, 
+            help    = 'The size of each range in a parallel download', 
+        )
+        parser.add_argument(
+            '--buffer-size', 
+            dest    = 'buffer_size', 
+            type    = parse_size, 
+            default = BUFSIZE, 
+            help    = 'How many bytes to read from the connection at once', 
+        )
+        parser.add_argument(
+            '--raw', 
+            dest    = 'raw', 
+            action  = 'store_true', 
+            help    = 'Do not decode objects uploaded with --compress', 
+        )
+        add_progress_arguments(parser)
         return parser
 
     @classmethod
-    def send_request(self, options):
+    def get_decoder(self, options, headers):
+        # None unless the whole object is read and was compressed
+        codec = headers.get('X-QS-Meta-' + CODEC_META)
+        if not codec or options.raw or options.bytes:
+            return None
+        return Decoder(codec)
+
+    @classmethod
+    def decode_file(self, options, path, headers):
+        # downloads are written as they are stored, so they can be resumed,
+        # and decoded once complete. returns the size of the file
+        decoder = self.get_decoder(options, headers)
+        if decoder is None:
+            return os.path.getsize(path)
+        tmp = '%s.qs_cli.tmp' % path
+        with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+            for chunk in iter(partial(src.read, options.buffer_size), b''):
+                dst.write(decoder.decode(chunk))
+        os.replace(tmp, path)
+        return os.path.getsize(path)
+
+    @classmethod
+    def fetch_range(self, bucket, key, etag, write, part, bufsize = BUFSIZE, 
+                    progress = None):
+        # write(chunk, offset) gets the chunks of the part as they arrive
+        part_number, offset, length = part
+        end   = offset + length
+        start = time.time()
+        resp  = self.call(bucket.get_object, 
+                    key, 
+                    if_match = etag, 
+                    range    = 'bytes=%d-%d' % (offset, end - 1), 
+                )
+        if resp.status_code != HTTP_OK_PARTIAL_CONTENT:
+            return resp
+        for chunk in self.iter_content(resp, bufsize):
+            write(chunk, offset)
+            offset += len(chunk)
+            if progress:
+                progress.update(len(chunk))
+        if offset != end:
+            raise IOError('short read, got %d of %d bytes' 
+                                            % (length - end + offset, length))
+        if progress:
+            progress.part(part_number, length, time.time() - start)
+        return resp
+
+    @classmethod
+    def send_ranged(self, options, path):
+        bucket = self.conn.Bucket(options.bucket, options.zone)
+        resp   = self.call(bucket.head_object, options.key)
+        if resp.status_code != HTTP_OK:
+            print(resp.status_code, resp.res.reason)
+            sys.exit(-1)
+        size    = int(resp.headers['Content-Length'])
+        etag    = resp.headers.get('ETag')
+        headers = resp.headers
+
+        parts  = get_part_ranges(size, options.part_size)
+        jobs   = max(1, options.jobs)
+        self.grow_connection_pool(jobs)
+
+        # finished ranges of an interrupted run are only trusted while the
+        # output file is still there and the object has the same etag
+        journal = Journal(options.zone, options.bucket, options.key, etag, 
+                          os.path.realpath(path), options.part_size)
+        if os.path.isfile(path):
+            done  = set(r['offset'] for r in journal.load())
+            parts = [part for part in parts if part[1] not in done]
+        else:
+            journal.remove()
+
+        progress = get_progress(options, options.key, size)
+        if progress:
+            progress.update(size - sum(part[2] for part in parts))
+
+        # every range is written to its own offset of the preallocated file
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o666)
+        try:
+            os.ftruncate(fd, size)
+            if size and hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(fd, 0, size)
+
+            error = None
+            with worker_pool(jobs) as pool:
+                futures = {
+                    pool.submit(self.fetch_range, bucket, options.key, 
+                                etag, partial(os.pwrite, fd), part, 
+                                options.buffer_size, 
+                                progress) : part
+                    for part in parts
+                }
+                for future in as_completed(futures):
+                    try:
+                        resp = future.result()
+                    except Exception as e:
+                        error = 'range %d: %s' % (futures[future][1], e)
+                    else:
+                        if resp.status_code == HTTP_OK_PARTIAL_CONTENT:
+                            journal.append({'offset' : futures[future][1]})
+                            continue
+                        error = 'range %d: %s %s' % (futures[future][1], 
+                                        resp.status_code, resp.res.reason)
+                    for f in futures: f.cancel()
+                    break
+        finally:
+            os.close(fd)
+            if progress:
+                progress.finish(ok = sys.exc_info()[0] is None and not error)
+
+        if error:
+            print('[ERROR] download of %s failed, %s' % (options.key, error))
+            print('[ERROR] rerun the same command to resume the download')
+            sys.exit(-1)
+        journal.remove()
+        size = self.decode_file(options, path, headers)
+        print(os.path.basename(path), '(' + str(size) 
+                                    + ' bytes) written successfully')
+
+    @classmethod
+    def fetch_buffer(self, bucket, key, etag, part, bufsize, progress):
+        # the bytes of one part, for writing the parts in order
+        buf  = bytearray(part[2])
+        view = memoryview(buf)
+        def write(chunk, offset):
+            view[offset - part[1]:offset - part[1] + len(chunk)] = chunk
+        resp = self.fetch_range(bucket, key, etag, write, part, bufsize, 
+                                progress)
+        if resp.status_code != HTTP_OK_PARTIAL_CONTENT:
+            raise IOError('range %d: %s %s' % (part[1], resp.status_code, 
+                                               resp.res.reason))
+        return buf
+
+    @classmethod
+    def send_stdout(self, options):
+        # streams the object to stdout, -j > 1 fetches ranges at the same
+        # time and writes them in order, holding at most 2 x jobs parts
+        out    = sys.stdout.buffer
+        bucket = self.conn.Bucket(options.bucket, options.zone)
+        try:
+            if options.jobs > 1 and not options.bytes:
+                resp = self.call(bucket.head_object, options.key)
+                if resp.status_code != HTTP_OK:
+                    raise IOError('%s %s' % (resp.status_code, 
+                                             resp.res.reason))
+                size     = int(resp.headers['Content-Length'])
+                etag     = resp.headers.get('ETag')
+                decoder  = self.get_decoder(options, resp.headers)
+                parts    = iter(get_part_ranges(size, options.part_size))
+                progress = get_progress(options, options.key, size)
+                jobs     = max(1, options.jobs)
+                self.grow_connection_pool(jobs)
+                window   = []
+                with worker_pool(jobs) as pool:
+                    def submit():
+                        part = next(parts, None)
+                        if part is not None:
+                            window.append(pool.submit(self.fetch_buffer, 
+                                    bucket, options.key, etag, part, 
+                                    options.buffer_size, progress))
+                    try:
+                        for i in range(jobs * 2):
+                            submit()
+                        while window:
+                            data = window.pop(0).result()
+                            submit()
+                            out.write(decoder.decode(data) if decoder 
+                                                           else data)
+                    except BaseException:
+                        for f in window: f.cancel()
+                        raise
+                    finally:
+                        if progress:
+                            progress.finish(ok = sys.exc_info()[0] is None)
+            else:
+                resp = self.call(bucket.get_object, 
+                            object_key = options.key, 
+                            range      = options.bytes and 
+                                            'bytes=%s' % options.bytes, 
+                        )
+                if resp.status_code not in (HTTP_OK, HTTP_OK_PARTIAL_CONTENT):
+                    raise IOError('%s %s %s' % (resp.status_code, 
+                                    resp.res.reason, resp.content.decode()))
+                size     = int(resp.headers.get('Content-Length') or 0)
+                decoder  = self.get_decoder(options, resp.headers)
+                progress = get_progress(options, options.key, size)
+                for chunk in self.iter_content(resp, options.buffer_size):
+                    out.write(decoder.decode(chunk) if decoder else chunk)
+                    if progress:
+                        progress.update(len(chunk))
+                if progress:
+                    progress.finish()
+            out.flush()
+        except BrokenPipeError:
+            # the reader went away, e.g. piped to head
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(-1)
+        except IOError as e:
+            # stdout carries the object, messages go to stderr
+            sys.stderr.write('[ERROR] %s\n' % e)
+            sys.exit(-1)
+
+    @classmethod
+    def get_path(self, options):
         if options.file:
             if os.path.isdir(options.file):
                 path = '%s/%s' % (options.file, options.key)
@@ -486,24 +3054,85 @@ class GetObjectAction(BaseAction):
         if not os.path.isdir(directory):
             print('[ERROR] No such directory %s' % directory)
             sys.exit(-1)
+        return path
+
+    @classmethod
+    def send_request(self, options):
+        if options.file == '-':
+            return self.send_stdout(options)
+        path = self.get_path(options)
+
+        if options.jobs > 1 and not options.bytes:
+            return self.send_ranged(options, path)
 
         ranges = ''
         if options.bytes:
             ranges = 'bytes=%s' % options.bytes
 
-        bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.get_object(object_key = options.key, range=ranges)
+        # an interrupted download continues after the bytes already in the
+        # file, as long as the object keeps the etag recorded in the journal
+        journal = None
+        etag    = None
+        written = 0
+        bounds  = parse_range(options.bytes)
+        if bounds is not None:
+            journal = Journal(options.zone, options.bucket, options.key, 
+                              os.path.realpath(path), options.bytes or '')
+            records = journal.load()
+            if records and os.path.isfile(path):
+                etag    = records[0]['etag']
+                written = os.path.getsize(path)
+                ranges  = 'bytes=%d-%s' % (bounds[0] + written, 
+                            '' if bounds[1] is None else bounds[1])
+                if bounds[1] is not None and bounds[0] + written > bounds[1]:
+                    # the range is complete already, nothing to ask for
+                    journal.remove()
+                    print(os.path.basename(path), '(' + str(written) 
+                                        + ' bytes) written successfully')
+                    return
 
-        if resp.status_code in(HTTP_OK, HTTP_OK_PARTIAL_CONTENT):
-            with open(path, 'wb') as f:
-                while True:
-                    try:
-                        buf = b''.join(resp.iter_content(BUFSIZE))
-                    except:     # chunk size less than BUFSIZE
-                        break
-                    if not buf: break
-                    f.write(buf)
-            print(os.path.basename(path), '(' + str(os.path.getsize(path)) 
+        bucket   = self.conn.Bucket(options.bucket, options.zone)
+        progress = get_progress(options, options.key)
+        resp     = self.call(bucket.get_object, 
+                    object_key = options.key, 
+                    if_match   = etag, 
+                    range      = ranges, 
+                )
+        if progress and resp.status_code not in (HTTP_OK, 
+                                                 HTTP_OK_PARTIAL_CONTENT):
+            progress.finish(ok = False)
+            progress = None
+
+        if etag and resp.status_code == HTTP_PRECONDITION_FAILED:
+            # the object changed since the interrupted run, start over
+            journal.remove()
+            return self.send_request(options)
+
+        if etag and resp.status_code == HTTP_RANGE_NOT_SATISFIABLE:
+            journal.remove()
+            print(os.path.basename(path), '(' + str(written) 
+                                        + ' bytes) written successfully')
+        elif resp.status_code in(HTTP_OK, HTTP_OK_PARTIAL_CONTENT):
+            if journal and not etag:
+                journal.append({'etag' : resp.headers.get('ETag')})
+            if resp.status_code == HTTP_OK:
+                # the range was ignored, the whole body replaces the file
+                written = 0
+            if progress and 'Content-Length' in resp.headers:
+                progress.total = written + int(resp.headers['Content-Length'])
+                progress.update(written)
+            # write every chunk as it arrives, memory stays at one buffer
+            with open(path, 'ab' if written else 'wb') as f:
+                for chunk in self.iter_content(resp, options.buffer_size):
+                    f.write(chunk)
+                    if progress:
+                        progress.update(len(chunk))
+            if progress:
+                progress.finish()
+            if journal:
+                journal.remove()
+            size = self.decode_file(options, path, resp.headers)
+            print(os.path.basename(path), '(' + str(size) 
                                         + ' bytes) written successfully')
         else:
             print(resp.status_code, resp.res.reason, resp.content.decode())
@@ -533,40 +3162,439 @@ class DeleteObjectAction(BaseAction):
     @classmethod
     def send_request(self, options):
         bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.delete_object(options.key)
+        resp   = self.call(bucket.delete_object, options.key)
+        self.invalidate(bucket, [options.key])
         # FIX: server side should not return 204 when key not exists
         print(resp.status_code, resp.res.reason, resp.content.decode())
 
-class HeadObjectAction(BaseAction):
-    command = 'head-object'
-    usage   = '%(prog)s -b <bucket> -k <key> [-z <zone> -f <conf_file>]'
+class DeleteObjectsAction(BaseAction):
+    command = 'delete-objects'
+    usage   = '%(prog)s -b <bucket> -p <prefix> | -K <keys_file> ' \
+                '[-j <jobs> -z <zone> -f <conf_file>]'
+
+    # cleared when the service does not support multi-object deletes
+    multi_delete = True
+
+    @classmethod
+    def add_ext_arguments(self, parser):
+        parser.add_argument(
+            '-b', 
+            '--bucket', 
+            dest     = 'bucket', 
+            required = True, 
+            help     = 'The bucket name', 
+        )
+        parser.add_argument(
+            '-p', 
+            '--prefix', 
+            dest = 'prefix', 
+            help = 'Delete every object starting with this prefix', 
+        )
+        parser.add_argument(
+            '-K', 
+            '--keys-file', 
+            dest = 'keys_file', 
+            help = 'Delete the keys listed in this file, one per line, '
+                   '- for stdin', 
+        )
+        parser.add_argument(
+            '-j', 
+            '--jobs', 
+            dest    = 'jobs', 
+            type    = int, 
+            default = MAX_WORKERS, 
+            help    = 'How many delete requests to send at the same time', 
+        )
+        return parser
+
+    @classmethod
+    def delete_multi(self, bucket, keys):
+        # returns the keys that were not deleted, None if unsupported,
+        # raises IOError when the request failed
+        objects = [{'key' : key} for key in keys]
+        body    = json.dumps({'objects' : objects, 'quiet' : True}, 
+                             sort_keys = True)
+        resp    = self.call(bucket.delete_multiple_objects, 
+                    content_md5 = base64.b64encode(
+                            hashlib.md5(body.encode()).digest()).decode(), 
+                    objects     = objects, 
+                    quiet       = True, 
+                )
+        if resp.status_code in (HTTP_METHOD_NOT_ALLOWED, HTTP_NOT_IMPLEMENTED):
+            return None
+        if resp.status_code != HTTP_OK:
+            raise IOError('%s %s' % (resp.status_code, resp.res.reason))
+        return [error['key'] for error in resp.get('errors') or []]
+
+    @classmethod
+    def delete_one(self, bucket, key):
+        try:
+            resp = self.call(bucket.delete_object, key)
+        except Exception:
+            return False
+        return resp.status_code == HTTP_OK_NO_CONTENT
+
+    @classmethod
+    def delete_batch(self, bucket, keys, retries):
+        # returns the keys still failing. call() retries the requests, the
+        # keys a multi-object delete reports as not deleted are sent again
+        # up to retries times
+        self.invalidate(bucket, keys)
+        if DeleteObjectsAction.multi_delete:
+            for attempt in range(retries + 1):
+                if attempt:
+                    time.sleep(backoff_delay(attempt))
+                failed = self.delete_multi(bucket, keys)
+                if failed is None:
+                    DeleteObjectsAction.multi_delete = False
+                    break
+                keys = failed
+                if not keys:
+                    return keys
+            else:
+                return keys
+        return [key for key in keys if not self.delete_one(bucket, key)]
+
+    @classmethod
+    def delete_keys(self, bucket, keys, jobs, retries = RETRIES):
+        # deletes keys from any iterable in batches on jobs workers,
+        # returns the number of deleted and failed keys
+        jobs   = max(1, jobs)
+        counts = [0, 0]
+        self.grow_connection_pool(jobs)
+
+        def batches():
+            batch = []
+            for key in keys:
+                batch.append(key)
+                if len(batch) == DELETE_BATCH:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        def done(batch, failed, error):
+            if error is not None:
+                print('[ERROR] failed to delete %d keys, %s' 
+                                                    % (len(batch), error))
+                failed = batch
+            for key in failed:
+                print('[ERROR] failed to delete %s' % key)
+            counts[0] += len(batch) - len(failed)
+            counts[1] += len(failed)
+
+        run_bounded(jobs, batches(), 
+                    partial(self.delete_batch, bucket, retries = retries), 
+                    done)
+        return counts[0], counts[1]
+
+    @classmethod
+    def send_request(self, options):
+        bucket = self.conn.Bucket(options.bucket, options.zone)
+        if options.keys_file == '-':
+            keys = (line.strip() for line in sys.stdin if line.strip())
+        elif options.keys_file:
+            if not os.path.isfile(options.keys_file):
+                print('[ERROR] No such file %s' % options.keys_file)
+                sys.exit(-1)
+            keys = (line.strip() for line in open(options.keys_file) 
+                                                    if line.strip())
+        elif options.prefix:
+            keys = (key['key'] for key in 
+                        list_all_objects(bucket, prefix = options.prefix))
+        else:
+            print('[ERROR] Must specify -p, --prefix, -K or --keys-file '
+                  'argument')
+            sys.exit(-1)
+
+        try:
+            deleted, failed = self.delete_keys(bucket, keys, options.jobs, 
+                                               options.retries)
+        except IOError as e:
+            print('[ERROR] %s' % e)
+            sys.exit(-1)
+        print('%d deleted, %d failed' % (deleted, failed))
+        if failed:
+            sys.exit(-1)
+
+class HeadObjectAction(BaseAction):
+    command = 'head-object'
+    usage   = '%(prog)s -b <bucket> -k <key> [--cache [<ttl>] -z <zone> ' \
+                                                    '-f <conf_file>]'
+
+    @classmethod
+    def add_ext_arguments(self, parser):
+        parser.add_argument(
+            '-b', 
+            '--bucket', 
+            dest     = 'bucket', 
+            required = True, 
+            help     = 'The bucket name', 
+        )
+        parser.add_argument(
+            '-k', 
+            '--key', 
+            dest     = 'key', 
+            required = True, 
+            help     = 'The object name', 
+        )
+        self.add_cache_argument(parser)
+        return parser
+
+    @classmethod
+    def send_request(self, options):
+        bucket = self.conn.Bucket(options.bucket, options.zone)
+        status, reason, headers = self.send_cached_head(options, options.key, 
+                    partial(self.call, bucket.head_object, options.key))
+        if status == HTTP_OK:
+            print(status, reason, headers)
+        else:
+            print(status, reason)
+
+class CopyObjectAction(BaseAction):
+    command = 'copy-object'
+    usage   = '%(prog)s -b <bucket> -k <key> -s <source_key> ' \
+                '[--source-bucket <bucket> -r -j <jobs> -z <zone> ' \
+                '-f <conf_file>]'
+
+    # move-object renames instead of copying
+    move = False
+
+    @classmethod
+    def add_ext_arguments(self, parser):
+        parser.add_argument(
+            '-b', 
+            '--bucket', 
+            dest     = 'bucket', 
+            required = True, 
+            help     = 'The destination bucket name', 
+        )
+        parser.add_argument(
+            '-k', 
+            '--key', 
+            dest     = 'key', 
+            required = True, 
+            help     = 'The destination object name, or prefix with -r', 
+        )
+        parser.add_argument(
+            '-s', 
+            '--source', 
+            dest     = 'source', 
+            required = True, 
+            help     = 'The source object name, or prefix with -r', 
+        )
+        parser.add_argument(
+            '--source-bucket', 
+            dest = 'source_bucket', 
+            help = 'The source bucket name, defaults to the destination '
+                   'bucket', 
+        )
+        parser.add_argument(
+            '-r', 
+            '--recursive', 
+            dest   = 'recursive', 
+            action = 'store_true', 
+            help   = 'Take every object starting with the source prefix, '
+                     'the prefix is replaced by the destination one', 
+        )
+        add_multipart_arguments(parser)
+        return parser
+
+    @classmethod
+    def get_source(self, bucket, key):
+        # the copy source header, the sdk url encodes it
+        return '/%s/%s' % (bucket.properties['bucket-name'], key)
+
+    @classmethod
+    def copy_part(self, dst, key, upload_id, source, etag, part):
+        part_number, offset, length = part
+        return self.call(dst.upload_multipart, 
+                    key, 
+                    part_number               = str(part_number), 
+                    upload_id                 = upload_id, 
+                    x_qs_copy_source          = source, 
+                    x_qs_copy_range           = 'bytes=%d-%d' 
+                                            % (offset, offset + length - 1), 
+                    x_qs_copy_source_if_match = etag, 
+                )
+
+    @classmethod
+    def copy_multipart(self, src, dst, options, key, dest_key, headers, 
+                       pool):
+        # copies the parts on the shared pool, every part is pinned to the
+        # etag of the head so a source changing midway fails the copy.
+        # raises IOError after aborting the upload
+        meta  = dict((k[len('X-QS-Meta-'):], v) for k, v in headers.items() 
+                            if k.lower().startswith('x-qs-meta-'))
+        resp  = self.call(dst.initiate_multipart_upload, 
+                    dest_key, 
+                    content_type   = headers.get('Content-Type'), 
+                    x_qs_meta_data = meta or None, 
+                    idempotent     = False, 
+                )
+        if resp.status_code != HTTP_OK:
+            raise IOError('%s %s %s' % (resp.status_code, resp.res.reason, 
+                                        resp.content.decode()))
+        upload_id = resp['upload_id']
+        source    = self.get_source(src, key)
+        parts     = get_part_ranges(int(headers['Content-Length']), 
+                                    options.part_size)
+        futures   = dict((pool.submit(self.copy_part, dst, dest_key, 
+                            upload_id, source, headers.get('ETag'), part), 
+                          part[0]) for part in parts)
+        error = None
+        for future in as_completed(futures):
+            try:
+                resp = future.result()
+            except Exception as e:
+                error = 'part %d: %s' % (futures[future], e)
+            else:
+                if resp.status_code == HTTP_OK_CREATED:
+                    continue
+                error = 'part %d: %s %s' % (futures[future], 
+                                    resp.status_code, resp.res.reason)
+            for f in futures: f.cancel()
+            break
+
+        if error is None:
+            resp = self.call(dst.complete_multipart_upload, 
+                        dest_key, 
+                        upload_id    = upload_id, 
+                        object_parts = [{'part_number' : part[0]} 
+                                                        for part in parts], 
+                        idempotent   = False, 
+                    )
+            if resp.status_code == HTTP_OK_CREATED:
+                return resp
+            error = '%s %s' % (resp.status_code, resp.res.reason)
+        try:
+            self.call(dst.abort_multipart_upload, dest_key, 
+                      upload_id = upload_id)
+        except Exception:
+            pass
+        raise IOError('copy of %s failed, %s' % (key, error))
+
+    @classmethod
+    def copy_one(self, src, dst, options, key, dest_key, size, pool, 
+                 headers = None):
+        # one server side copy or move, objects above the threshold are
+        # copied in parts. returns the response of the last request
+        source = self.get_source(src, key)
+        if self.move:
+            resp = self.call(dst.put_object, 
+                        dest_key, 
+                        x_qs_move_source = source, 
+                        idempotent       = False, 
+                    )
+            self.invalidate(src, [key])
+        elif size > options.threshold:
+            if headers is None:
+                resp = self.call(src.head_object, key)
+                if resp.status_code != HTTP_OK:
+                    return resp
+                headers = resp.headers
+            resp = self.copy_multipart(src, dst, options, key, dest_key, 
+                                       headers, pool)
+        else:
+            resp = self.call(dst.put_object, 
+                        dest_key, 
+                        x_qs_copy_source = source, 
+                    )
+        self.invalidate(dst, [dest_key])
+        return resp
+
+    @classmethod
+    def is_nested(self, key, source):
+        # whether the destination prefix lies inside the source one, on
+        # whole path segments: a/ -> a/b/ does, logs -> logs-archive/ not
+        if not source:
+            return True
+        return (key.rstrip('/') + '/').startswith(source.rstrip('/') + '/')
 
     @classmethod
-    def add_ext_arguments(self, parser):
-        parser.add_argument(
-            '-b', 
-            '--bucket', 
-            dest     = 'bucket', 
-            required = True, 
-            help     = 'The bucket name', 
-        )
-        parser.add_argument(
-            '-k', 
-            '--key', 
-            dest     = 'key', 
-            required = True, 
-            help     = 'The object name', 
-        )
-        return parser
+    def copy_prefix(self, src, dst, options):
+        # keys are listed while the first ones are copied, at most jobs
+        # keys and jobs parts are in flight. returns done and failed counts
+        jobs   = max(1, options.jobs)
+        counts = [0, 0]
+        self.grow_connection_pool(jobs * 2)
+
+        def done(entry, resp, error):
+            if error is None and resp.status_code != HTTP_OK_CREATED:
+                error = '%s %s' % (resp.status_code, resp.res.reason)
+            if error is not None:
+                print('[ERROR] failed to %s %s, %s' % (self.move and 'move' 
+                                        or 'copy', entry['key'], error))
+            counts[error is not None] += 1
+
+        entries = list_all_objects(src, prefix = options.source)
+        if src is dst and options.key.startswith(options.source):
+            # a destination next to the source (logs -> logs-archive/)
+            # matches its prefix too, its keys are not part of the source
+            entries = (entry for entry in entries 
+                            if not entry['key'].startswith(options.key))
+
+        with worker_pool(jobs) as parts:
+            run_bounded(jobs, entries, 
+                        lambda entry: self.copy_one(src, dst, options, 
+                            entry['key'], 
+                            options.key + entry['key'][len(options.source):], 
+                            entry.get('size') or 0, parts), 
+                        done)
+        return counts[0], counts[1]
 
     @classmethod
     def send_request(self, options):
-        bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.head_object(options.key)
-        if resp.status_code == HTTP_OK:
-            print(resp.status_code, resp.res.reason, resp.headers)
-        else:
-            print(resp.status_code, resp.res.reason)
+        dst = self.conn.Bucket(options.bucket, options.zone)
+        src = dst
+        if options.source_bucket and options.source_bucket != options.bucket:
+            src = self.conn.Bucket(options.source_bucket, options.zone)
+        if src is dst and (options.key == options.source or 
+                options.recursive and self.is_nested(options.key, 
+                                                     options.source)):
+            print('[ERROR] The destination is inside the source')
+            sys.exit(-1)
+
+        if options.recursive:
+            try:
+                done, failed = self.copy_prefix(src, dst, options)
+            except IOError as e:
+                print('[ERROR] %s' % e)
+                sys.exit(-1)
+            print('%d %s, %d failed' % (done, 
+                            self.move and 'moved' or 'copied', failed))
+            if failed:
+                sys.exit(-1)
+            return
+
+        headers = None
+        size    = 0
+        if not self.move:
+            resp = self.call(src.head_object, options.source)
+            if resp.status_code != HTTP_OK:
+                print(resp.status_code, resp.res.reason)
+                sys.exit(-1)
+            headers = resp.headers
+            size    = int(headers.get('Content-Length') or 0)
+        if size > options.threshold:
+            self.grow_connection_pool(options.jobs)
+        try:
+            with worker_pool(max(1, options.jobs)) as pool:
+                resp = self.copy_one(src, dst, options, options.source, 
+                                     options.key, size, pool, headers)
+        except IOError as e:
+            print('[ERROR] %s' % e)
+            sys.exit(-1)
+        print(resp.status_code, resp.res.reason, resp.content.decode())
+
+class MoveObjectAction(CopyObjectAction):
+    command = 'move-object'
+    usage   = '%(prog)s -b <bucket> -k <key> -s <source_key> ' \
+                '[--source-bucket <bucket> -r -j <jobs> -z <zone> ' \
+                '-f <conf_file>]'
+
+    # the service renames the object, whatever its size
+    move = True
 
 class InitiateMultipartAction(BaseAction):
     command = 'initiate-multipart'
@@ -601,13 +3629,18 @@ class InitiateMultipartAction(BaseAction):
     @classmethod
     def send_request(self, options):
         bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.initiate_multipart_upload(options.key, options.type)
+        resp   = self.call(bucket.initiate_multipart_upload, 
+                    options.key, 
+                    options.type, 
+                    idempotent = False, 
+                )
         print(resp.status_code, resp.res.reason, resp.content.decode())
 
 class UploadMultipartAction(BaseAction):
     command = 'upload-multipart'
     usage   = '%(prog)s -b <bucket> -k <key> -u <upload_id> -p <part_number>' \
-                      ' -F <file> -d <data> [-z <zone> -f <conf_file>]'
+                      ' -F <file> -d <data> [--part-size <size> -z <zone> ' \
+                      '-f <conf_file>]'
 
     @classmethod
     def add_ext_arguments(self, parser):
@@ -652,28 +3685,94 @@ class UploadMultipartAction(BaseAction):
             dest = 'data', 
             help = 'The object data', 
         )
+        parser.add_argument(
+            '--part-size', 
+            dest = 'part_size', 
+            type = parse_size, 
+            help = 'Upload only the part_number-th slice of this size of '
+                   '-F, straight from the whole file', 
+        )
         return parser
 
+    @classmethod
+    def get_slice(self, options):
+        # (offset, length) of the part in -F
+        size = os.path.getsize(options.file)
+        if not options.part_size:
+            return 0, size
+        offset = options.part_number * options.part_size
+        if offset >= size:
+            print('[ERROR] part %d starts after the end of %s' 
+                                    % (options.part_number, options.file))
+            sys.exit(-1)
+        return offset, min(options.part_size, size - offset)
+
+    @classmethod
+    def is_uploaded(self, bucket, journal, options, fingerprint):
+        records = journal.load()
+        if records:
+            return any(r['part_number'] == options.part_number 
+                        and r['fingerprint'] == fingerprint for r in records)
+
+        # no journal, ask the server which parts it already has, the part
+        # is sent again when it cannot tell
+        try:
+            uploaded = list_uploaded_parts(bucket, options.key, 
+                                           options.upload_id)
+        except IOError:
+            return False
+        if not uploaded or options.part_number not in uploaded:
+            return False
+        if options.file:
+            offset, size = self.get_slice(options)
+            etag = part_etag(options.file, offset, size)
+        else:
+            size = len(options.data.encode())
+            etag = '"%s"' % hashlib.md5(options.data.encode()).hexdigest()
+        return uploaded[options.part_number] == (size, etag)
+
     @classmethod
     def send_request(self, options):
         if options.file:
             if not os.path.isfile(options.file):
                 print("[ERROR] No such file %s" % options.file)
                 sys.exit(-1)
-            data = open(options.file, "rb")
+            fingerprint = '%s:%d:%d' % ((file_fingerprint(options.file), ) 
+                                        + self.get_slice(options))
         elif options.data:
-            data = options.data
+            fingerprint = hashlib.md5(options.data.encode()).hexdigest()
         else:
             print("[ERROR] Must specify -F, --file, -d or --data argument")
             sys.exit(-1)
 
-        bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.upload_multipart(
-                    options.key, 
-                    options.part_number, 
-                    options.upload_id, 
-                    body = data
-                )
+        bucket  = self.conn.Bucket(options.bucket, options.zone)
+        journal = Journal(options.zone, options.bucket, options.key, 
+                          options.upload_id)
+        if self.is_uploaded(bucket, journal, options, fingerprint):
+            print('Part %d of %s already uploaded, skipped' 
+                                % (options.part_number, options.upload_id))
+            return
+
+        if options.file:
+            data = FileSlice(options.file, *self.get_slice(options))
+        else:
+            data = options.data
+        try:
+            resp = self.call(bucket.upload_multipart, 
+                        options.key, 
+                        str(options.part_number), 
+                        options.upload_id, 
+                        body = data
+                    )
+        finally:
+            if options.file:
+                data.close()
+        if resp.status_code == HTTP_OK_CREATED:
+            journal.append({
+                'part_number' : options.part_number, 
+                'etag'        : resp.headers.get('ETag'), 
+                'fingerprint' : fingerprint, 
+            })
 
         print(resp.status_code, resp.res.reason, resp.content.decode())
 
@@ -724,7 +3823,7 @@ class ListMultipartAction(BaseAction):
     @classmethod
     def send_request(self, options):
         bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.list_multipart(
+        resp   = self.call(bucket.list_multipart, 
                     options.key, 
                     options.limit, 
                     options.part_number_marker, 
@@ -786,12 +3885,17 @@ class CompleteMultipartAction(BaseAction):
             })
 
         bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.complete_multipart_upload(
+        resp   = self.call(bucket.complete_multipart_upload, 
                     options.key, 
                     options.upload_id, 
                     options.etag, 
                     object_parts = parts, 
+                    idempotent   = False, 
                 )
+        self.invalidate(bucket, [options.key])
+        if resp.status_code == HTTP_OK_CREATED:
+            Journal(options.zone, options.bucket, options.key, 
+                    options.upload_id).remove()
 
         print(resp.status_code, resp.res.reason, resp.content.decode())
 
@@ -828,9 +3932,781 @@ class AbortMultipartAction(BaseAction):
     @classmethod
     def send_request(self, options):
         bucket = self.conn.Bucket(options.bucket, options.zone)
-        resp   = bucket.abort_multipart_upload(options.key, options.upload_id)
+        resp   = self.call(bucket.abort_multipart_upload, 
+                    options.key, 
+                    options.upload_id, 
+                )
+        if resp.status_code == HTTP_OK_NO_CONTENT:
+            Journal(options.zone, options.bucket, options.key, 
+                    options.upload_id).remove()
         print(resp.status_code, resp.res.reason, resp.content.decode())
 
+class GcMultipartAction(BaseAction):
+    command = 'gc-multipart'
+    usage   = '%(prog)s -b <bucket> [-p <prefix> --older-than <age> -n ' \
+                '-j <jobs> -z <zone> -f <conf_file>]'
+
+    @classmethod
+    def add_ext_arguments(self, parser):
+        parser.add_argument(
+            '-b', 
+            '--bucket', 
+            dest     = 'bucket', 
+            required = True, 
+            help     = 'The bucket name', 
+        )
+        parser.add_argument(
+            '-p', 
+            '--prefix', 
+            dest = 'prefix', 
+            help = 'Only abort the uploads of keys starting with this prefix', 
+        )
+        parser.add_argument(
+            '--older-than', 
+            dest    = 'older_than', 
+            type    = parse_age, 
+            default = GC_AGE, 
+            help    = 'Only abort the uploads initiated longer ago than '
+                      'this, e.g. 3600, 12h, 30d (default %ds)' % GC_AGE, 
+        )
+        parser.add_argument(
+            '-n', 
+            '--dry-run', 
+            dest   = 'dry_run', 
+            action = 'store_true', 
+            help   = 'Only print the uploads that would be aborted', 
+        )
+        parser.add_argument(
+            '-j', 
+            '--jobs', 
+            dest    = 'jobs', 
+            type    = int, 
+            default = MAX_WORKERS, 
+            help    = 'How many uploads to abort at the same time', 
+        )
+        return parser
+
+    @classmethod
+    def is_expired(self, upload, before):
+        # uploads without a creation time are never taken
+        import calendar
+        created = upload.get('created')
+        if not created:
+            return False
+        return calendar.timegm(time.strptime(created[:19], 
+                                             '%Y-%m-%dT%H:%M:%S')) < before
+
+    @classmethod
+    def collect(self, bucket, options, upload):
+        # returns the bytes held by the parts of the upload, None when it
+        # is gone already, the upload is aborted unless on a dry run.
+        # raises IOError when it cannot be listed or aborted
+        key, upload_id = upload['key'], upload['upload_id']
+        parts = list_uploaded_parts(bucket, key, upload_id)
+        if parts is None:
+            return None
+        size  = sum(part[0] for part in parts.values())
+        if not options.dry_run:
+            resp = self.call(bucket.abort_multipart_upload, 
+                        key, 
+                        upload_id = upload_id, 
+                    )
+            if resp.status_code != HTTP_OK_NO_CONTENT:
+                raise IOError('%s %s' % (resp.status_code, resp.res.reason))
+            Journal(options.zone, options.bucket, key, upload_id).remove()
+        return size
+
+    @classmethod
+    def send_request(self, options):
+        bucket = self.conn.Bucket(options.bucket, options.zone)
+        before = time.time() - options.older_than
+        jobs   = max(1, options.jobs)
+        counts = [0, 0, 0]
+        self.grow_connection_pool(jobs)
+
+        def done(upload, size, error):
+            if error is not None:
+                print('[ERROR] failed to abort %s %s, %s' 
+                        % (upload['key'], upload['upload_id'], error))
+                counts[2] += 1
+            elif size is not None:
+                print('%s %s %s %d' % (options.dry_run and 'would abort' 
+                        or 'aborted', upload['key'], upload['upload_id'], 
+                        size))
+                counts[0] += 1
+                counts[1] += size
+
+        uploads = (upload for upload in list_multipart_uploads(bucket, 
+                                                        options.prefix) 
+                            if self.is_expired(upload, before))
+        try:
+            run_bounded(jobs, uploads, 
+                        partial(self.collect, bucket, options), done)
+        except IOError as e:
+            print('[ERROR] %s' % e)
+            sys.exit(-1)
+
+        print('%d %s, %d bytes (%s) %s, %d failed' % (counts[0], 
+                options.dry_run and 'to abort' or 'aborted', counts[1], 
+                format_size(counts[1]), 
+                options.dry_run and 'to reclaim' or 'reclaimed', counts[2]))
+        if counts[2]:
+            sys.exit(-1)
+
+class SyncAction(BaseAction):
+    command = 'sync'
+    usage   = '%(prog)s -b <bucket> -L <dir> [-p <prefix> --download ' \
+              '--delete --checksum --raw -j <jobs> --part-size <size> ' \
+              '--multipart-threshold <size> --progress --progress-fd <fd> ' \
+              '-z <zone> -f <conf_file>]'
+
+    @classmethod
+    def add_ext_arguments(self, parser):
+        parser.add_argument(
+            '-b', 
+            '--bucket', 
+            dest     = 'bucket', 
+            required = True, 
+            help     = 'The bucket name', 
+        )
+        parser.add_argument(
+            '-L', 
+            '--local-dir', 
+            dest     = 'local_dir', 
+            required = True, 
+            help     = 'The local directory to sync', 
+        )
+        parser.add_argument(
+            '-p', 
+            '--prefix', 
+            dest    = 'prefix', 
+            default = '', 
+            help    = 'The prefix the directory maps to', 
+        )
+        parser.add_argument(
+            '--download', 
+            dest    = 'download', 
+            action  = 'store_true', 
+            help    = 'Sync from the bucket to the local directory', 
+        )
+        parser.add_argument(
+            '--delete', 
+            dest    = 'delete', 
+            action  = 'store_true', 
+            help    = 'Delete what does not exist on the source side', 
+        )
+        parser.add_argument(
+            '--checksum', 
+            dest    = 'checksum', 
+            action  = 'store_true', 
+            help    = 'Compare the content hash with the etag, '
+                      'not the modification time', 
+        )
+        parser.add_argument(
+            '--raw', 
+            dest    = 'raw', 
+            action  = 'store_true', 
+            help    = 'Do not decode objects uploaded with --compress', 
+        )
+        add_multipart_arguments(parser)
+        add_progress_arguments(parser)
+        parser.set_defaults(type = 'application/octet-stream', 
+                            upload_id = None, bytes = None)
+        return parser
+
+    @classmethod
+    def walk_local(self, root):
+        # relative path -> (path, size, mtime)
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                rel  = os.path.relpath(path, root).replace(os.sep, '/')
+                try:
+                    st = os.stat(path)
+                except OSError as e:    # a broken symlink
+                    sys.stderr.write('[WARN] skipping %s: %s\n' 
+                                                    % (path, e.strerror))
+                    continue
+                files[rel] = (path, st.st_size, int(st.st_mtime))
+        return files
+
+    @classmethod
+    def walk_remote(self, bucket, prefix):
+        # relative key -> (size, mtime, etag)
+        objects = {}
+        for obj in list_all_objects(bucket, prefix = prefix):
+            if obj['key'].endswith('/'):    # directory placeholder
+                continue
+            objects[obj['key'][len(prefix):]] = (
+                    obj['size'], obj.get('modified', 0), obj.get('etag'))
+        return objects
+
+    @classmethod
+    def is_changed(self, options, local, remote):
+        if local is None or remote is None:
+            return True
+        path, size, mtime = local
+        rsize, rmtime, etag = remote
+        # decoded downloads differ in size from the object, they are
+        # recognized by the modification time sync gave them
+        if size != rsize and not (options.download and mtime == rmtime):
+            return True
+        if options.checksum and etag:
+            return not same_etag(etag, 
+                                 local_etag(path, etag, options.part_size))
+        if options.download:
+            return rmtime > mtime
+        return mtime > rmtime
+
+    @classmethod
+    def download(self, bucket, options, key, path, mtime, progress = None):
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok = True)
+        resp = self.call(bucket.get_object, key)
+        if resp.status_code != HTTP_OK:
+            return resp
+        # never leave a half written file under the real name
+        tmp     = '%s.qs_cli.tmp' % path
+        decoder = GetObjectAction.get_decoder(options, resp.headers)
+        with open(tmp, 'wb') as f:
+            for chunk in self.iter_content(resp, BUFSIZE):
+                f.write(decoder.decode(chunk) if decoder else chunk)
+                if progress:
+                    progress.update(len(chunk))
+        os.utime(tmp, (mtime, mtime))
+        os.replace(tmp, path)
+        return resp
+
+    @classmethod
+    def sync_one(self, bucket, options, rel, local, remote, progress = None):
+        # returns None when nothing had to be done
+        if not self.is_changed(options, local, remote):
+            if progress:
+                progress.update(remote[0] if options.download else local[1])
+            return None
+        key = options.prefix + rel
+        if options.download:
+            path = os.path.join(options.local_dir, *rel.split('/'))
+            return self.download(bucket, options, key, path, remote[1], 
+                                 progress)
+        return CreateObjectAction.upload_file(bucket, options, key, local[0], 
+                                              progress)
+
+    @classmethod
+    def send_request(self, options):
+        if not os.path.isdir(options.local_dir):
+            if not options.download:
+                print('[ERROR] No such directory %s' % options.local_dir)
+                sys.exit(-1)
+            os.makedirs(options.local_dir)
+        if options.prefix and not options.prefix.endswith('/'):
+            options.prefix += '/'
+
+        bucket = self.conn.Bucket(options.bucket, options.zone)
+        try:
+            remote = self.walk_remote(bucket, options.prefix)
+        except IOError as e:
+            print('[ERROR] %s' % e)
+            sys.exit(-1)
+        local  = self.walk_local(options.local_dir)
+
+        if options.download:
+            source, target, verb, ok = remote, local, 'download', HTTP_OK
+        else:
+            source, target, verb, ok = local, remote, 'upload', HTTP_OK_CREATED
+
+        # keys escaping the local directory are never written
+        source = dict((rel, item) for rel, item in source.items() 
+                        if not options.download or '..' not in rel.split('/'))
+
+        jobs = max(1, options.jobs)
+        self.grow_connection_pool(jobs)
+
+        # one progress for all files, unchanged files count as done
+        progress = get_progress(options, '%s/%s' % (options.bucket, 
+                                                    options.prefix), 
+                    sum(item[0 if options.download else 1] 
+                                            for item in source.values()))
+
+        # files run on the jobs workers, each large upload sends its parts
+        # one at a time so no more than jobs connections are in use
+        file_options = Namespace(**dict(vars(options), jobs = 1))
+        counts       = [0, 0]
+
+        def done(rel, resp, error):
+            if error is None and resp is None:
+                return
+            if error is None and resp.status_code != ok:
+                error = '%s %s' % (resp.status_code, resp.res.reason)
+            if error is not None:
+                print('[ERROR] %s %s: %s' % (verb, rel, error))
+            else:
+                print('%s: %s' % (verb, rel))
+            counts[error is not None] += 1
+
+        run_bounded(jobs, sorted(source), 
+                    lambda rel: self.sync_one(bucket, file_options, rel, 
+                                    local.get(rel), remote.get(rel), 
+                                    progress), 
+                    done)
+        transferred, failed = counts
+        deleted = 0
+        if progress:
+            progress.finish(ok = not failed)
+
+        if options.delete and options.download:
+            for rel in sorted(set(target) - set(source)):
+                os.remove(target[rel][0])
+                print('delete: %s' % rel)
+                deleted += 1
+        elif options.delete:
+            # in batches on the workers, failed keys are printed
+            done, errors = DeleteObjectsAction.delete_keys(bucket, 
+                    [options.prefix + rel for rel in 
+                                        sorted(set(target) - set(source))], 
+                    options.jobs, options.retries)
+            deleted += done
+            failed  += errors
+
+        print('%d transferred, %d deleted, %d failed' 
+                                        % (transferred, deleted, failed))
+        if failed:
+            sys.exit(-1)
+
+
+class BatchAction(BaseAction):
+    command = 'batch'
+    usage   = '%(prog)s [-i <file> -j <jobs> --async -z <zone> ' \
+                                                    '-f <conf_file>]'
+
+    # options set up once for the process, operations cannot change them
+    shared  = ('retries', 'timeout', 'deadline', 'limit_rate', 
+               'limit_requests', 'limit_file', 'trace', 'metrics')
+
+    @classmethod
+    def add_ext_arguments(self, parser):
+        parser.add_argument(
+            '-i', 
+            '--input', 
+            dest    = 'input', 
+            default = '-', 
+            help    = 'Read operations from this file instead of stdin, one '
+                      'per line, either as action arguments or as a json '
+                      'list or {"action": ..., "args": [...]} record', 
+        )
+        parser.add_argument(
+            '-j', 
+            '--jobs', 
+            dest    = 'jobs', 
+            type    = int, 
+            default = MAX_WORKERS, 
+            help    = 'How many operations to run at the same time', 
+        )
+        parser.add_argument(
+            '--async', 
+            dest    = 'use_async', 
+            action  = 'store_true', 
+            help    = 'Run single part create-object, get-object, '
+                      'head-object and delete-object operations on an '
+                      'asyncio event loop (needs aiohttp), -j then limits '
+                      'the operations in flight', 
+        )
+        return parser
+
+    @classmethod
+    def parse_line(self, line):
+        if line.startswith('{'):
+            record = json.loads(line)
+            return [record['action']] + list(record.get('args') or [])
+        if line.startswith('['):
+            return [str(arg) for arg in json.loads(line)]
+        return shlex.split(line)
+
+    @classmethod
+    def parse_operation(self, options, line):
+        # returns the action and its options, exits on invalid lines
+        args   = self.parse_line(line)
+        action = ActionManager.get_action(args[0] if args else '')
+        if action in (NoAction, BatchAction, ServeAction):
+            print('[ERROR] invalid action in %s' % line)
+            sys.exit(-1)
+        # operations share the batch config file, connection and zone
+        args   = ['-f', options.conf_file] + args[1:]
+        if options.zone is not None:
+            args = ['-z', options.zone] + args
+        parser = action.get_argument_parser(args)
+        op     = parser.parse_args(args)
+        # a later -f or -z in the line would win over the batch ones
+        if op.conf_file != options.conf_file:
+            print('[ERROR] -f can only be given to batch itself, not in %s' 
+                                                                    % line)
+            sys.exit(-1)
+        if options.zone is not None and op.zone != options.zone:
+            print('[ERROR] -z %s conflicts with the batch zone %s in %s' 
+                                            % (op.zone, options.zone, line))
+            sys.exit(-1)
+        # and the request options, which apply to everything in flight
+        for name in self.shared:
+            if getattr(op, name) != parser.get_default(name):
+                print('[ERROR] --%s can only be given to batch itself, '
+                      'not in %s' % (name.replace('_', '-'), line))
+                sys.exit(-1)
+        return action, op
+
+    @classmethod
+    def run_one(self, options, line):
+        # returns (exit status, output) of one operation
+        output = io.StringIO()
+        sys.stdout.redirect(output)
+        try:
+            action, op = self.parse_operation(options, line)
+            action.send_request(op)
+            return 0, output.getvalue()
+        except SystemExit as e:
+            return e.code or 0, output.getvalue()
+        except Exception as e:
+            print('[ERROR] %s: %s' % (line, e))
+            return -1, output.getvalue()
+        finally:
+            sys.stdout.redirect(None)
+
+    @classmethod
+    def is_async(self, action, op):
+        # operations the asyncio core can do in a single request
+        if action is HeadObjectAction:
+            return op.cache is None
+        if action is DeleteObjectAction:
+            return True
+        if action is CreateObjectAction:
+            if op.skip_existing or op.compress:
+                return False
+            return bool(op.data) or bool(op.file) and \
+                os.path.isfile(op.file) and \
+                os.path.getsize(op.file) <= op.threshold
+        if action is GetObjectAction:
+            return op.jobs <= 1 and not op.bytes and op.file != '-'
+        return False
+
+    @classmethod
+    async def run_async(self, transport, action, op):
+        # the asyncio counterpart of send_request for the single request
+        # actions, returns the printed line
+        bucket = self.conn.Bucket(op.bucket, op.zone)
+        if action is HeadObjectAction:
+            status, reason, headers, body = await transport.send(
+                                bucket.head_object_request(op.key))
+            if status == HTTP_OK:
+                return '%s %s %s' % (status, reason, dict(headers))
+            return '%s %s' % (status, reason)
+
+        if action is DeleteObjectAction:
+            status, reason, headers, body = await transport.send(
+                                bucket.delete_object_request(op.key))
+            self.invalidate(bucket, [op.key])
+            return '%s %s %s' % (status, reason, body.decode())
+
+        if action is CreateObjectAction:
+            if op.file:
+                with open(op.file, 'rb') as f:
+                    status, reason, headers, body = await transport.send(
+                                bucket.put_object_request(op.key, 
+                                                          body = f))
+            else:
+                status, reason, headers, body = await transport.send(
+                                bucket.put_object_request(op.key, 
+                                                body = op.data.encode()))
+            self.invalidate(bucket, [op.key])
+            return '%s %s %s' % (status, reason, body.decode())
+
+        # the body goes to a temporary file, an existing file is only
+        # replaced once the object is complete
+        path = GetObjectAction.get_path(op)
+        tmp  = '%s.qs_cli.tmp' % path
+        try:
+            with open(tmp, 'wb') as sink:
+                status, reason, headers, body = await transport.send(
+                                bucket.get_object_request(op.key), sink)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        if status != HTTP_OK:
+            os.remove(tmp)
+            return '%s %s %s' % (status, reason, body.decode())
+        if GetObjectAction.get_decoder(op, headers) is not None:
+            import asyncio
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, 
+                        GetObjectAction.decode_file, op, tmp, headers)
+            except BaseException:
+                os.remove(tmp)
+                raise
+        os.replace(tmp, path)
+        return '%s (%d bytes) written successfully' % (
+                            os.path.basename(path), os.path.getsize(path))
+
+    @classmethod
+    async def run_one_async(self, transport, pool, options, line):
+        # returns (exit status, output) of one operation
+        import asyncio
+        try:
+            action, op = self.parse_operation(options, line)
+        except SystemExit as e:
+            return e.code or 0, ''
+        except Exception as e:
+            return -1, '[ERROR] %s: %s\n' % (line, e)
+        if not self.is_async(action, op):
+            return await asyncio.get_running_loop().run_in_executor(
+                                    pool, self.run_one, options, line)
+        try:
+            return 0, await self.run_async(transport, action, op) + '\n'
+        except SystemExit as e:
+            return e.code or 0, ''
+        except Exception as e:
+            return -1, '[ERROR] %s: %s\n' % (line, e)
+
+    @classmethod
+    async def send_async(self, options, lines, counts):
+        import asyncio
+        import aiohttp
+
+        jobs      = max(1, options.jobs)
+        pending   = asyncio.Semaphore(jobs)
+        loop      = asyncio.get_running_loop()
+        tasks     = set()
+        connector = aiohttp.TCPConnector(limit = 0, limit_per_host = jobs)
+        timeout   = aiohttp.ClientTimeout(sock_connect = options.timeout, 
+                                          sock_read    = options.timeout)
+
+        def finish(task):
+            tasks.discard(task)
+            pending.release()
+            code, output = task.result()
+            sys.stdout.write(output)
+            counts['done'] += 1
+            if code:
+                counts['failed'] += 1
+
+        async with aiohttp.ClientSession(connector = connector, 
+                                         timeout   = timeout, 
+                                         auto_decompress = False) as session:
+            transport = AsyncTransport(session)
+            # operations the core cannot do run on a few threads
+            with worker_pool(MAX_WORKERS) as pool:
+                while True:
+                    line = await loop.run_in_executor(None, lines.readline)
+                    if not line:
+                        break
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    await pending.acquire()
+                    task = loop.create_task(self.run_one_async(
+                                    transport, pool, options, line))
+                    tasks.add(task)
+                    task.add_done_callback(finish)
+                if tasks:
+                    await asyncio.wait(list(tasks))
+
+    @classmethod
+    def send_request(self, options):
+        if options.input == '-':
+            lines = sys.stdin
+        elif os.path.isfile(options.input):
+            lines = open(options.input)
+        else:
+            print('[ERROR] No such file %s' % options.input)
+            sys.exit(-1)
+
+        if options.use_async:
+            try:
+                import asyncio
+                import aiohttp
+            except ImportError:
+                print('[ERROR] --async needs the aiohttp package')
+                sys.exit(-1)
+            counts = {'done' : 0, 'failed' : 0}
+            stdout = sys.stdout
+            sys.stdout = ThreadOutput(stdout)
+            try:
+                asyncio.run(self.send_async(options, lines, counts))
+            finally:
+                sys.stdout = stdout
+            print('%d operations, %d failed' 
+                                    % (counts['done'], counts['failed']))
+            if counts['failed']:
+                sys.exit(-1)
+            return
+
+        jobs = max(1, options.jobs)
+        self.grow_connection_pool(jobs)
+
+        # keep a bounded number of operations queued, the input may be long
+        stdout = sys.stdout
+        counts = {'done' : 0, 'failed' : 0}
+
+        def done(line, result, error):
+            code, output = result or (-1, '[ERROR] %s: %s\n' % (line, error))
+            stdout.write(output)
+            stdout.flush()
+            counts['done'] += 1
+            if code:
+                counts['failed'] += 1
+
+        ops = (line for line in (line.strip() for line in lines) 
+                            if line and not line.startswith('#'))
+        sys.stdout = ThreadOutput(stdout)
+        try:
+            run_bounded(jobs, ops, partial(self.run_one, options), done)
+        finally:
+            sys.stdout = stdout
+
+        print('%d operations, %d failed' % (counts['done'], counts['failed']))
+        if counts['failed']:
+            sys.exit(-1)
+
+
+class ServeAction(BaseAction):
+    command = 'serve'
+    usage   = '%(prog)s [-s <socket> -z <zone> -f <conf_file>]'
+
+    # conf file -> connection, every config gets its own credentials
+    connections = {}
+
+    @classmethod
+    def add_ext_arguments(self, parser):
+        parser.add_argument(
+            '-s', 
+            '--socket', 
+            dest    = 'socket', 
+            default = os.environ.get(SOCKET_ENV) or 
+                        os.path.expanduser(SOCKET), 
+            help    = 'The unix socket to listen on, clients find it '
+                      'through $%s' % SOCKET_ENV, 
+        )
+        return parser
+
+    @classmethod
+    def dispatch(self, argv):
+        # runs one forwarded command line, returns its exit status
+        try:
+            chk_args(['qs_cli'] + argv)
+            action = get_action(argv[0])
+            if action in (ServeAction, BatchAction):
+                print('[ERROR] %s cannot run in a server' % argv[0])
+                return -1
+            options, conf = action.get_options(argv[1:])
+            if getattr(options, 'progress', False) or \
+                    getattr(options, 'progress_fd', None) is not None:
+                print('[ERROR] --progress and --progress-fd cannot run in '
+                      'a server')
+                return -1
+            if options.conf_file not in self.connections:
+                BaseAction.conn = self.get_connection(conf)
+                self.setup_connection(options)
+                self.connections[options.conf_file] = BaseAction.conn
+            else:
+                BaseAction.conn = self.connections[options.conf_file]
+                self.apply_options(options)
+            BaseAction.retry_stats.update(retries = 0, delay = 0.0)
+            try:
+                action.send_request(options)
+            finally:
+                action.report_retries()
+                BaseAction.throttle.report()
+                BaseAction.tracer.flush()
+            return 0
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                return e.code or 0
+            print(e.code)
+            return -1
+        except Exception as e:
+            print('[ERROR] %s' % e)
+            return -1
+
+    @classmethod
+    def handle(self, conn, lock):
+        # one request per connection: a json line with argv and cwd
+        with conn:
+            try:
+                request = json.loads(conn.makefile('rb').readline())
+            except ValueError:
+                return
+            out = SocketOutput(conn, b'o')
+            err = SocketOutput(conn, b'e')
+            # commands run one at a time, in the working directory
+            # of their client
+            with lock:
+                sys.stdout.redirect(out)
+                sys.stderr.redirect(err)
+                try:
+                    os.chdir(request.get('cwd') or '/')
+                    code = self.dispatch(request.get('argv') or [])
+                except OSError as e:
+                    # a bad working directory, or a client that went away
+                    # and cannot be told anything
+                    try:
+                        err.write('[ERROR] %s\n' % e)
+                    except OSError:
+                        return
+                    code = -1
+                finally:
+                    sys.stdout.redirect(None)
+                    sys.stderr.redirect(None)
+            try:
+                SocketOutput(conn, b'x').write(str(code))
+            except OSError:     # the client went away
+                pass
+
+    @classmethod
+    def send_request(self, options):
+        self.connections[options.conf_file] = self.conn
+        # only the socket of a server that is gone is replaced
+        if os.path.lexists(options.socket):
+            if not stat.S_ISSOCK(os.lstat(options.socket).st_mode):
+                print('[ERROR] %s exists and is not a socket' 
+                                                    % options.socket)
+                sys.exit(-1)
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(options.socket)
+            except OSError:
+                os.remove(options.socket)
+            else:
+                print('[ERROR] A server is already listening on %s' 
+                                                    % options.socket)
+                sys.exit(-1)
+            finally:
+                probe.close()
+        # the socket is created without access for anyone else
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask  = os.umask(0o177)
+        try:
+            server.bind(options.socket)
+        finally:
+            os.umask(umask)
+        server.listen(64)
+        print('listening on %s' % options.socket)
+        sys.stdout.flush()
+
+        lock = threading.Lock()
+        sys.stdout = ThreadOutput(sys.stdout)
+        sys.stderr = ThreadOutput(sys.stderr)
+        try:
+            while True:
+                conn, _ = server.accept()
+                threading.Thread(target = self.handle, args = (conn, lock), 
+                                 daemon = True).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sys.stdout = sys.stdout.stream
+            sys.stderr = sys.stderr.stream
+            server.close()
+            os.remove(options.socket)
+
 
 class ActionManager(object):
     dispatch_table = [
@@ -841,6 +4717,7 @@ class ActionManager(object):
         ('head-bucket', HeadBucketAction), 
         ('stats-bucket', StatsBucketAction), 
         ('list-objects', ListObjectsAction), 
+        ('index', IndexAction), 
 
         ('get-bucket-acl', GetBucketAclAction), 
         ('set-bucket-acl', SetBucketAclAction), 
@@ -848,13 +4725,21 @@ class ActionManager(object):
         ('create-object', CreateObjectAction), 
         ('get-object', GetObjectAction), 
         ('delete-object', DeleteObjectAction), 
+        ('delete-objects', DeleteObjectsAction), 
         ('head-object', HeadObjectAction), 
+        ('copy-object', CopyObjectAction), 
+        ('move-object', MoveObjectAction), 
 
         ('initiate-multipart', InitiateMultipartAction), 
         ('upload-multipart', UploadMultipartAction), 
         ('list-multipart', ListMultipartAction), 
         ('complete-multipart', CompleteMultipartAction), 
         ('abort-multipart', AbortMultipartAction), 
+        ('gc-multipart', GcMultipartAction), 
+
+        ('sync', SyncAction), 
+        ('batch', BatchAction), 
+        ('serve', ServeAction), 
     ]
 
     @classmethod
@@ -906,9 +4791,50 @@ def chk_args(args):
 def get_action(action):
     return ActionManager.get_action(action)
 
+def forward(path, args):
+    # runs args in the serve process listening on path, returns the exit
+    # status or None when there is no server to talk to
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+
+    with sock:
+        sock.sendall(json.dumps({'argv' : args, 'cwd' : os.getcwd()}).encode() 
+                                                                    + b'\n')
+        stream  = sock.makefile('rb')
+        outputs = {b'o' : sys.stdout.buffer, b'e' : sys.stderr.buffer}
+        while True:
+            header = stream.read(5)
+            if len(header) < 5:
+                print('[ERROR] lost connection to server %s' % path)
+                return -1
+            size = struct.unpack('>I', header[1:])[0]
+            data = stream.read(size)
+            if header[:1] == b'x':
+                return int(data)
+            outputs[header[:1]].write(data)
+            outputs[header[:1]].flush()
+
+def runs_locally(args):
+    # commands reading stdin ('-') or reporting progress to the terminal
+    # or file descriptors of this process, the server has neither
+    return '-' in args or any(arg.startswith('--prog') for arg in args)
+
 def main():
     args = sys.argv
     chk_args(args)
+
+    # as do actions serving themselves
+    path = os.environ.get(SOCKET_ENV)
+    if path and args[1] not in ('serve', 'batch') and \
+                                            not runs_locally(args[2:]):
+        code = forward(path, args[1:])
+        if code is not None:
+            sys.exit(code)
+
     action = get_action(args[1])
     action.main(args[2:])
 
@@ -0,0 +1,90 @@
+# serve mode against the benchmark stub server
+#
+#   python3 -m unittest discover -s tests
+
+import os
+import sys
+import json
+import socket
+import struct
+import subprocess
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+                                os.path.abspath(__file__))), 'bench'))
+
+from common import Stub, QS_CLI
+
+class ServeProgressTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stub   = Stub()
+        self.socket = os.path.join(self.stub.dir, 'serve.sock')
+        self.env    = dict(self.stub.env(), QS_CLI_SOCKET = self.socket)
+        self.server = subprocess.Popen([sys.executable, QS_CLI, 'serve',
+                                        '-f', self.stub.conf,
+                                        '-s', self.socket],
+                                       env = self.env,
+                                       stdout = subprocess.PIPE,
+                                       stderr = subprocess.STDOUT)
+        self.assertIn(b'listening on', self.server.stdout.readline())
+
+    def tearDown(self):
+        self.server.terminate()
+        self.server.wait()
+        self.server.stdout.close()
+        self.stub.__exit__()
+
+    def server_output(self):
+        self.server.terminate()
+        self.server.wait()
+        return self.server.stdout.read().decode()
+
+    def test_progress_fd_stays_with_the_client(self):
+        target = os.path.join(self.stub.dir, 'object')
+        rfd, wfd = os.pipe()
+        try:
+            code = subprocess.call([sys.executable, QS_CLI, 'get-object',
+                                    '-f', self.stub.conf, '-b', 'bench',
+                                    '-k', 'virtual/4M', '-F', target,
+                                    '--progress-fd', str(wfd)],
+                                   env = self.env, pass_fds = (wfd, ),
+                                   stdout = subprocess.DEVNULL)
+            os.close(wfd)
+            with os.fdopen(rfd, 'rb') as f:
+                events = [json.loads(line) for line in f]
+        except Exception:
+            os.close(rfd)
+            raise
+        self.assertEqual(code, 0)
+        self.assertEqual(os.path.getsize(target), 4 << 20)
+        self.assertEqual(events[-1]['event'], 'done')
+        self.assertEqual(events[-1]['bytes'], 4 << 20)
+        self.assertNotIn('"event"', self.server_output())
+
+    def test_server_refuses_progress_fd(self):
+        # a request sent straight to the socket, not through main()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket)
+        with sock:
+            sock.sendall(json.dumps({
+                'argv' : ['get-object', '-f', self.stub.conf, '-b', 'bench',
+                          '-k', 'virtual/1K', '-F', os.devnull,
+                          '--progress-fd', '1'],
+                'cwd'  : self.stub.dir,
+            }).encode() + b'\n')
+            stream = sock.makefile('rb')
+            output = b''
+            while True:
+                header = stream.read(5)
+                self.assertEqual(len(header), 5)
+                data = stream.read(struct.unpack('>I', header[1:])[0])
+                if header[:1] == b'x':
+                    break
+                output += data
+        self.assertEqual(int(data), -1)
+        self.assertIn(b'--progress-fd', output)
+        self.assertNotIn('"event"', self.server_output())
+
+if __name__ == '__main__':
+    unittest.main()